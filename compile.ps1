@@ -1 +1 @@
-C:\Users\dchas\AppData\Roaming\Python\Python313\Scripts\pyinstaller --noconsole --onefile --distpath . --icon=vtview.ico --add-data "vtview.ini;." vtview.py
\ No newline at end of file
+C:\Users\dchas\AppData\Roaming\Python\Python313\Scripts\pyinstaller --noconfirm --distpath . vtview.spec
\ No newline at end of file
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+VIDEO_EXTS = (".mp4", ".webm")
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    models, videos, all_videos = tmp_path / "models", tmp_path / "vids", tmp_path / "all"
+    for path in (models / "anna", videos, all_videos):
+        path.mkdir(parents=True)
+    return str(models), str(videos), str(all_videos)
@@ -0,0 +1,15 @@
+import vtview
+from vtview import DecoderBackend
+
+
+def test_installed_decoders_loads_each_backend(monkeypatch):
+    def missing_library():
+        raise OSError("libfoo.so: cannot open shared object file")
+
+    backends = dict(vtview.DECODER_BACKENDS)
+    backends["foo"] = DecoderBackend(missing_library, (".jpg",), None)
+    monkeypatch.setattr(vtview, "DECODER_BACKENDS", backends)
+    monkeypatch.setattr(vtview, "_installed_decoders", None)
+    installed = vtview.installed_decoders()
+    assert "foo" not in installed
+    assert "pillow" in installed
@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+from conftest import VIDEO_EXTS
+from vtview import IngestService
+
+
+@pytest.mark.parametrize("name, dest", [("anna-clip.mp4", 1), ("clip.mp4", 2), ("anna-beach.jpg", None)])
+def test_ingest_tosses_prefixed_and_unprefixed_videos(tmp_path, dirs, name, dest):
+    downloads = tmp_path / "downloads"
+    downloads.mkdir()
+    (downloads / name).write_bytes(b"x")
+    service = IngestService(str(downloads), dirs, (".jpg", ".mp4"), VIDEO_EXTS, str(tmp_path / "ingest.log"))
+    try:
+        service.process(name, (1, 0))
+    finally:
+        service.stop()
+    folder = os.path.join(dirs[0], "anna") if dest is None else dirs[dest]
+    assert os.listdir(folder) == [name]
+    assert not (downloads / name).exists()
@@ -0,0 +1,50 @@
+from vtview import ImageMeta, VideoMeta, parse_query
+
+
+def matches(query, meta):
+    _, filters = parse_query(query)
+    return all(f(meta) for f in filters)
+
+
+def test_terms_and_filters_are_split():
+    terms, filters = parse_query("  Anna w>3000 BEACH fmt=PNG ")
+    assert terms == ["anna", "beach"]
+    assert len(filters) == 2
+
+
+def test_unparseable_values_stay_search_terms():
+    terms, filters = parse_query("w>wide ar=")
+    assert terms == ["w>wide", "ar="]
+    assert filters == []
+
+
+def test_image_filters():
+    meta = ImageMeta(4000, 3000, "PNG", 1, 1)
+    assert matches("w>3000 h<=3000 mp=12 fmt=png", meta)
+    assert matches("ar>1.3 ar<1.4 frames=1", meta)
+    assert not matches("w>=4001", meta)
+    assert not matches("fmt!=png", meta)
+
+
+def test_rotated_images_filter_on_display_size():
+    meta = ImageMeta(4000, 3000, "JPEG", 1, 6)
+    assert matches("w=3000 h=4000 ar<1", meta)
+
+
+def test_files_without_metadata_never_match():
+    assert not matches("w>0", None)
+    assert matches("anna", None)
+
+
+def test_video_filters():
+    meta = VideoMeta(1920, 1080, "MP4", "hevc", 90.0, 5_000_000)
+    assert matches("dur>60 codec=hevc kbps>4000 w=1920 fmt=mp4", meta)
+    assert not matches("codec=h264", meta)
+    assert not matches("frames>1", meta)
+
+
+def test_video_fields_never_match_images():
+    meta = ImageMeta(4000, 3000, "PNG", 1, 1)
+    assert not matches("dur>0", meta)
+    assert not matches("kbps>0", meta)
+    assert not matches("codec!=hevc", meta)
@@ -0,0 +1,29 @@
+import pytest
+
+from vtview import similarity_chain
+
+np = pytest.importorskip("numpy")
+
+
+def clustered(sizes, dims=96, seed=1):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(len(sizes), dims)) * 10
+    labels = np.repeat(np.arange(len(sizes)), sizes)
+    rng.shuffle(labels)
+    features = centres[labels] + rng.normal(size=(len(labels), dims)) * 0.1
+    return features.astype(np.float32), labels
+
+
+def test_small_inputs_keep_their_order():
+    assert similarity_chain(np.zeros((2, 8), dtype=np.float32)) == [0, 1]
+    assert similarity_chain(np.zeros((0, 8), dtype=np.float32)) == []
+
+
+@pytest.mark.parametrize("neighbours, block", [(12, 512), (1, 7)])
+def test_chain_visits_every_row_once_cluster_by_cluster(neighbours, block):
+    features, labels = clustered([40, 25, 60])
+    chain = similarity_chain(features, neighbours=neighbours, block=block)
+    assert chain[0] == 0
+    assert sorted(chain) == list(range(len(features)))
+    switches = sum(labels[a] != labels[b] for a, b in zip(chain, chain[1:]))
+    assert switches == 2
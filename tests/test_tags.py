@@ -0,0 +1,84 @@
+import os
+import threading
+
+import vtview
+from vtview import apply_tag_plan, plan_tag_rename, retag_filename, scrub_filename, split_tags
+
+FORMATS = (".jpg", ".mp4")
+
+
+def test_split_tags_separates_head_priority_and_tags():
+    assert split_tags("anna-beach #sun#Blonde#sun") == ("anna-beach ", None, ["#blonde", "#sun"])
+    assert split_tags("root #b#1#a") == ("root ", "#1", ["#a", "#b"])
+
+
+def test_split_tags_without_tags():
+    assert not split_tags("anna-beach")
+
+
+def test_scrub_filename_dedupes_and_tidies():
+    assert scrub_filename("anna-beach  #sun #Blonde#sun.jpg") == "anna-beach #blonde#sun.jpg"
+    assert scrub_filename("anna-beach #b#1#a#2.jpg") == "anna-beach #2#a#b.jpg"
+    assert scrub_filename("anna-beach.jpg") == "anna-beach.jpg"
+
+
+def test_retag_replaces_whole_tags_only():
+    assert retag_filename("a #blond#blonde.jpg", "#blond", "#fair") == "a #blonde#fair.jpg"
+    assert retag_filename("a #blonde.jpg", "#blond", "#fair") == "a #blonde.jpg"
+
+
+def test_retag_drop_and_merge():
+    assert retag_filename("a #sun#blonde.jpg", "#sun", "") == "a #blonde.jpg"
+    assert retag_filename("a #sun.jpg", "#sun", "") == "a.jpg"
+    assert retag_filename("a #blond#blonde.jpg", "#blond", "#blonde") == "a #blonde.jpg"
+
+
+def touch(folder, *names):
+    os.makedirs(folder, exist_ok=True)
+    for name in names:
+        with open(os.path.join(folder, name), "wb"):
+            pass
+
+
+def test_plan_reports_collisions_and_apply_renames(tmp_path):
+    touch(tmp_path / "a", "x #sun.jpg", "y #sun.jpg", "y #day.jpg", "notes #sun.txt")
+    touch(tmp_path / "a" / "b", "z #sun#day.mp4", "w #sunny.jpg")
+    touch(tmp_path / "c", "p #sun.jpg", "p #sun#day.jpg")
+    plan, conflicts = plan_tag_rename([str(tmp_path)], "#sun", "#day", FORMATS, workers=2)
+
+    assert sorted((src, dst) for _, src, dst in plan) == [("x #sun.jpg", "x #day.jpg"),
+                                                        ("z #sun#day.mp4", "z #day.mp4")]
+    assert sorted((src, reason) for _, src, _, reason in conflicts) == [
+        ("p #sun#day.jpg", "several files would get this name"),
+        ("p #sun.jpg", "several files would get this name"),
+        ("y #sun.jpg", "target already exists"),
+    ]
+
+    journal = tmp_path / "journal.tsv"
+    assert apply_tag_plan(plan, str(journal), batch_size=1) == []
+    assert sorted(os.listdir(tmp_path / "a")) == ["b", "notes #sun.txt", "x #day.jpg", "y #day.jpg", "y #sun.jpg"]
+    assert sorted(os.listdir(tmp_path / "a" / "b")) == ["w #sunny.jpg", "z #day.mp4"]
+    kinds = [line.split("\t")[0] for line in journal.read_text(encoding="utf-8").splitlines()]
+    assert kinds == ["plan", "done", "plan", "done"]
+
+
+def test_apply_records_failures(tmp_path):
+    touch(tmp_path, "x #sun.jpg", "x #day.jpg")
+    failures = apply_tag_plan([(str(tmp_path), "x #sun.jpg", "x #day.jpg"),
+                               (str(tmp_path), "gone #sun.jpg", "gone #day.jpg")], str(tmp_path / "j.tsv"))
+    assert [src for _, src, _, _ in failures] == ["x #sun.jpg", "gone #sun.jpg"]
+    assert sorted(os.listdir(tmp_path)) == ["j.tsv", "x #day.jpg", "x #sun.jpg"]
+
+
+def test_tag_ids_stay_consistent_across_threads():
+    def intern(offset):
+        for i in range(5000):
+            vtview.tag_id(f"#thread{(i * 7 + offset) % 2000}")
+
+    threads = [threading.Thread(target=intern, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(vtview.TAG_IDS) == len(vtview.TAG_NAMES)
+    assert all(vtview.TAG_NAMES[tid] == tag for tag, tid in vtview.TAG_IDS.items())
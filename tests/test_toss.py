@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from conftest import VIDEO_EXTS
+from vtview import FileRecord, toss_target
+
+
+def target(name, dirs):
+    return toss_target(FileRecord(name, None, VIDEO_EXTS), *dirs)
+
+
+def test_image_goes_to_its_model_folder(dirs):
+    assert target("anna-beach #x.jpg", dirs) == os.path.join(dirs[0], "anna")
+    assert target("anna #x.jpg", dirs) == os.path.join(dirs[0], "anna")
+
+
+def test_image_without_model_folder_stays(dirs):
+    assert target("bob-beach.jpg", dirs) is None
+    assert target("photo.jpg", dirs) is None
+
+
+def test_video_of_known_model_goes_to_video_base(dirs):
+    assert target("anna-clip #x.mp4", dirs) == dirs[1]
+
+
+@pytest.mark.parametrize("name", ["bob-clip.mp4", "clip.mp4", "clip#x.mp4", "clip #x.webm"])
+def test_other_videos_go_to_video_all(dirs, name):
+    assert target(name, dirs) == dirs[2]
+
+
+def test_video_stays_without_video_folders(dirs, tmp_path):
+    assert toss_target(FileRecord("clip.mp4", None, VIDEO_EXTS), dirs[0], None, str(tmp_path / "missing")) is None
@@ -0,0 +1,128 @@
+import struct
+
+import pytest
+
+from vtview import check_video, probe_video
+
+
+def box(kind, *children):
+    payload = b"".join(children)
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+
+def mp4(video=True, duration=10, timescale=1000, mdat=b"\0" * 4096):
+    mvhd = box(b"mvhd", struct.pack(">B3xIIII", 0, 0, 0, timescale, duration * timescale), b"\0" * 80)
+    tracks = [box(b"trak",
+                  box(b"tkhd", b"\0" * 76, struct.pack(">II", 1920 << 16, 1080 << 16)),
+                  box(b"mdia",
+                      box(b"hdlr", b"\0" * 8, b"vide", b"\0" * 12),
+                      box(b"minf", box(b"stbl", box(b"stsd", struct.pack(">4xII4s", 1, 86, b"avc1"),
+                                                     b"\0" * 24, struct.pack(">HH", 1920, 1080))))))]
+    audio = box(b"trak",
+                box(b"tkhd", b"\0" * 84),
+                box(b"mdia",
+                    box(b"hdlr", b"\0" * 8, b"soun", b"\0" * 12),
+                    box(b"minf", box(b"stbl", box(b"stsd", struct.pack(">4xII4s", 1, 36, b"mp4a"), b"\0" * 28)))))
+    return box(b"ftyp", b"isom\0\0\0\0isom") + box(b"moov", mvhd, *(tracks if video else []), audio) + box(b"mdat", mdat)
+
+
+def element(element_id, *children):
+    payload = b"".join(children)
+    return element_id + b"\x01" + len(payload).to_bytes(7, "big") + payload
+
+
+def uint(element_id, value):
+    return element(element_id, value.to_bytes(4, "big"))
+
+
+def matroska(doctype=b"webm", video=True, cluster=b"\0" * 4096):
+    header = element(b"\x1a\x45\xdf\xa3", element(b"\x42\x82", doctype))
+    info = element(b"\x15\x49\xa9\x66", uint(b"\x2a\xd7\xb1", 1_000_000), element(b"\x44\x89", struct.pack(">d", 12500)))
+    entries = [element(b"\xae", uint(b"\x83", 2), element(b"\x86", b"A_OPUS"))]
+    if video:
+        entries.insert(0, element(b"\xae", uint(b"\x83", 1), element(b"\x86", b"V_VP9"),
+                                  element(b"\xe0", uint(b"\xb0", 1280), uint(b"\xba", 720))))
+    segment = element(b"\x18\x53\x80\x67", info, element(b"\x16\x54\xae\x6b", *entries),
+                      element(b"\x1f\x43\xb6\x75", cluster))
+    return header + segment
+
+
+def chunk(kind, payload):
+    return struct.pack("<4sI", kind, len(payload)) + payload + b"\0" * (len(payload) & 1)
+
+
+def riff_list(list_type, *children):
+    return chunk(b"LIST", list_type + b"".join(children))
+
+
+def avi(frames=250, usec=40000, video=True, odml_frames=None, movi=b"\0" * 4096):
+    avih = chunk(b"avih", struct.pack("<10I", usec, 0, 0, 0, frames, 0, 1, 0, 640, 480) + b"\0" * 16)
+    streams = []
+    if video:
+        streams.append(riff_list(b"strl", chunk(b"strh", b"vidsDIVX" + b"\0" * 48),
+                                 chunk(b"strf", struct.pack("<IiiHH4s", 40, 640, 480, 1, 24, b"XVID") + b"\0" * 20)))
+    streams.append(riff_list(b"strl", chunk(b"strh", b"auds\0\0\0\0" + b"\0" * 48), chunk(b"strf", b"\0" * 18)))
+    if odml_frames is not None:
+        streams.append(riff_list(b"odml", chunk(b"dmlh", struct.pack("<I", odml_frames) + b"\0" * 244)))
+    body = b"AVI " + riff_list(b"hdrl", avih, *streams) + riff_list(b"movi", movi)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_probe_mp4(tmp_path):
+    meta = probe_video(write(tmp_path, "a.mp4", mp4()))
+    assert meta[:5] == (1920, 1080, "MP4", "h264", 10)
+    assert meta.bitrate == int(len(mp4()) * 8 / 10)
+    assert probe_video(write(tmp_path, "a.mov", mp4())).format == "MOV"
+
+
+def test_probe_matroska(tmp_path):
+    assert probe_video(write(tmp_path, "a.webm", matroska()))[:5] == (1280, 720, "WEBM", "vp9", 12.5)
+    assert probe_video(write(tmp_path, "a.mkv", matroska(b"matroska")))[:3] == (1280, 720, "MKV")
+
+
+def test_probe_avi(tmp_path):
+    assert probe_video(write(tmp_path, "a.avi", avi()))[:5] == (640, 480, "AVI", "mpeg4", 10)
+
+
+def test_probe_avi_prefers_opendml_frame_count(tmp_path):
+    assert probe_video(write(tmp_path, "a.avi", avi(odml_frames=90000))).duration == 3600
+
+
+def test_probe_rejects_other_data(tmp_path):
+    assert probe_video(write(tmp_path, "a.mp4", b"not a movie at all")) is None
+    assert probe_video(write(tmp_path, "a.avi", b"RIFF\0\0\0\0WAVE")) is None
+
+
+@pytest.mark.parametrize("name, data", [("a.mp4", mp4()), ("a.webm", matroska()), ("a.avi", avi())],
+                         ids=["mp4", "webm", "avi"])
+def test_check_accepts_whole_files(tmp_path, name, data):
+    assert check_video(write(tmp_path, name, data)) is None
+
+
+@pytest.mark.parametrize("name, data", [("a.mp4", mp4(video=False)), ("a.webm", matroska(video=False)),
+                                        ("a.avi", avi(video=False))], ids=["mp4", "webm", "avi"])
+def test_audio_only_is_not_broken(tmp_path, name, data):
+    path = write(tmp_path, name, data)
+    assert probe_video(path) is None
+    assert check_video(path) is None
+
+
+@pytest.mark.parametrize("name, data, reason", [
+    ("a.mp4", mp4()[:-100], "truncated mdat box"),
+    ("a.mp4", box(b"ftyp", b"isom") + box(b"mdat", b"\0" * 64), "missing moov box"),
+    ("a.webm", matroska()[:-100], "truncated: Segment extends past end of file"),
+    ("a.avi", avi()[:-100], "truncated: RIFF size exceeds file"),
+], ids=["mp4", "mp4-no-moov", "webm", "avi"])
+def test_check_finds_truncation(tmp_path, name, data, reason):
+    assert check_video(write(tmp_path, name, data)) == reason
+
+
+def test_check_flags_unreadable_header(tmp_path):
+    moov = box(b"moov", box(b"free", b"\0" * 16))
+    assert check_video(write(tmp_path, "a.mp4", box(b"ftyp", b"isom") + moov)) == "unreadable container header"
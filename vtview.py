@@ -1,33 +1,2236 @@
+import time
+_process_start = time.perf_counter()
+
+import io
 import os
+import sys
 import shutil
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
-from PIL import Image, ImageTk
 from functools import partial
 import configparser
 import re
-import webbrowser
+import math
+import json
+import base64
+import sqlite3
+import struct
+import operator
+from collections import namedtuple, OrderedDict, Counter
+
+# PIL is imported lazily (see load_source_image) so the window can appear
+# before the imaging stack has finished loading.
+
+PRIORITY_TAGS = ("#1", "#2", "#3", "#4", "#5")
+SORT_METHODS = ["Name", "Natural", "Size", "Created", "Modified", "Priority", "Tag count", "Model",
+                "Megapixels", "Aspect ratio", "Format", "Duration", "Bitrate", "Similarity"]
+
+_natural_split_re = re.compile(r"(\d+)")
+_hashtag_re = re.compile(r"#\w+")
+_model_re = re.compile(r"([^-\s]+)")
+
+MEDIA_IMAGE = 0
+MEDIA_VIDEO = 1
+
+# Tags are interned to small ints so each record holds a tuple of ids rather
+# than its own copies of the tag strings.
+# Scans run on several threads at once, so new tags are added under a lock;
+# lookups of known tags don't need it.
+TAG_IDS = {}
+TAG_NAMES = []
+_tag_lock = threading.Lock()
+
+def tag_id(tag: str) -> int:
+    tid = TAG_IDS.get(tag)
+    if tid is None:
+        with _tag_lock:
+            tid = TAG_IDS.get(tag)
+            if tid is None:
+                TAG_NAMES.append(tag)
+                tid = TAG_IDS[tag] = len(TAG_NAMES) - 1
+    return tid
+
+def natural_key(name: str) -> tuple:
+    parts = _natural_split_re.split(name.lower())
+    return tuple(int(p) if i % 2 else p for i, p in enumerate(parts))
+
+def split_tags(base: str):
+    # "root #b#1#a" -> ("root ", "#1", ["#a", "#b"]), or None without tags.
+    # The last priority tag wins; other tags are lowercased and deduplicated.
+    idx = base.find("#")
+    if idx < 0 or idx == len(base) - 1:
+        return None
+    priority = None
+    other_tags = set()
+    for tag in _hashtag_re.findall(base, idx):
+        tag = tag.lower()
+        if tag in PRIORITY_TAGS:
+            priority = tag
+        else:
+            other_tags.add(tag)
+    return base[:idx], priority, sorted(other_tags)
+
+class FileRecord:
+    # One parsed "model-root #tags.ext" filename plus its stat fields. Built
+    # once per folder scan; sorting, search, toss and index all read from it.
+    __slots__ = ("name", "lower", "model", "group", "root", "priority", "tags", "ext", "media", "size", "ctime",
+                 "mtime")
+
+    def __init__(self, name: str, stat=None, video_exts=()):
+        base, ext = os.path.splitext(name)
+        parsed = split_tags(base)
+        if parsed:
+            head, priority, tags = parsed
+            self.priority = int(priority[1]) if priority else 0
+            self.tags = tuple(sorted(tag_id(t) for t in tags))
+        else:
+            head = base
+            self.priority = 0
+            self.tags = ()
+        # Model is the leading token when something follows it; grouping,
+        # the Model sort and make-index use it. Toss keeps its own rule, see
+        # toss_target.
+        match = _model_re.match(head)
+        if match and len(match.group(1)) < len(head):
+            self.model = match.group(1)
+            rest = head[len(self.model):]
+            self.root = (rest[1:] if rest.startswith("-") else rest).strip()
+        else:
+            self.model = ""
+            self.root = head.strip()
+        self.group = sys.intern(self.model.lower())  # group-mode key
+        self.name = name
+        self.lower = name.lower()
+        self.ext = sys.intern(ext.lower())
+        self.media = MEDIA_VIDEO if self.ext in video_exts else MEDIA_IMAGE
+        self.size = stat.st_size if stat else 0
+        self.ctime = stat.st_ctime if stat else 0
+        self.mtime = stat.st_mtime if stat else 0
+
+    @property
+    def tag_string(self) -> str:
+        tags = [f"#{self.priority}"] if self.priority else []
+        return "".join(tags + sorted(TAG_NAMES[t] for t in self.tags))
+
+    @property
+    def is_indexable(self) -> bool:
+        # make_index_file needs "model-..." with no whitespace in the model
+        return bool(self.model) and self.name[len(self.model)] == "-"
+
+class TagFacets:
+    # Tag and priority counts for the loaded folder. Built once per scan and
+    # then adjusted per record as files are renamed, added or removed.
+    def __init__(self):
+        self.tag_counts = Counter()
+        self.priority_counts = Counter()
+
+    def rebuild(self, records):
+        self.tag_counts = Counter(t for r in records for t in r.tags)
+        self.priority_counts = Counter(r.priority for r in records if r.priority)
+
+    def add(self, record, sign=1):
+        for t in record.tags:
+            self.tag_counts[t] += sign
+            if not self.tag_counts[t]:
+                del self.tag_counts[t]
+        if record.priority:
+            self.priority_counts[record.priority] += sign
+            if not self.priority_counts[record.priority]:
+                del self.priority_counts[record.priority]
+
+    def remove(self, record):
+        self.add(record, -1)
+
+def facet_rows(tag_counts, priority_counts, selected=()):
+    # [(key, label)] with #1-#5 first, then tags by descending count. Selected
+    # facets stay listed even when the current filter leaves them at zero.
+    rows = []
+    for p in range(1, 6):
+        key = f"#{p}"
+        if priority_counts.get(p) or key in selected:
+            rows.append((key, f"{key} ({priority_counts.get(p, 0)})"))
+    counted = {TAG_NAMES[t]: c for t, c in tag_counts.items()}
+    for key in selected:
+        if key not in PRIORITY_TAGS:
+            counted.setdefault(key, 0)
+    for key, count in sorted(counted.items(), key=lambda kv: (-kv[1], kv[0])):
+        rows.append((key, f"{key} ({count})"))
+    return rows
+
+def format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def toss_target(record, model_base_dir, video_base_dir, video_all_dir):
+    # Where Alt-T (and the ingest service) sends a file, or None to leave it.
+    # Toss matches the whole filename up to the first dash or space, as it
+    # always has, so a video without a "model-" prefix (clip.mp4) still has
+    # no model folder and goes to VideoAllDir.
+    match = _model_re.match(record.name)
+    if not match:
+        return None
+    model_folder = os.path.join(model_base_dir, match.group(1))
+    model_folder_exists = os.path.isdir(model_folder)
+
+    if record.media == MEDIA_VIDEO:
+        if model_folder_exists and video_base_dir and os.path.isdir(video_base_dir):
+            return video_base_dir
+        elif video_all_dir and os.path.isdir(video_all_dir):
+            return video_all_dir
+        return None  # skip if neither video base dir exists
+    if not model_folder_exists:
+        return None
+    return model_folder
+
+def scan_folder(folder, supported_formats, video_exts=()):
+    records = []
+    with os.scandir(folder) as it:
+        for dir_entry in it:
+            if not dir_entry.name.lower().endswith(supported_formats):
+                continue
+            try:
+                stat = dir_entry.stat()
+            except OSError:
+                stat = None
+            records.append(FileRecord(dir_entry.name, stat, video_exts))
+    return records
+
+class ImageMeta(namedtuple("ImageMeta", "width height format frames orientation")):
+    __slots__ = ()
+
+    @property
+    def display_size(self):
+        # EXIF orientations 5-8 are rotated by 90 degrees
+        if self.orientation in (5, 6, 7, 8):
+            return self.height, self.width
+        return self.width, self.height
+
+    @property
+    def megapixels(self):
+        return self.width * self.height / 1_000_000
+
+    @property
+    def aspect(self):
+        w, h = self.display_size
+        return w / h if h else 0
+
+DEFAULT_MAX_IMAGE_PIXELS = 250_000_000
+
+def set_max_image_pixels(config):
+    # [Settings] max_image_pixels, passed through the environment so worker
+    # processes (spawned fresh on Windows) pick it up as well
+    limit = config.getint("Settings", "max_image_pixels", fallback=DEFAULT_MAX_IMAGE_PIXELS)
+    os.environ["VTVIEW_MAX_IMAGE_PIXELS"] = str(limit)
+
+def pil_image():
+    # Every PIL entry point goes through here so the probe, the integrity
+    # check and all decoders share one pixel limit: Pillow's default refuses
+    # ordinary panoramas, but no limit at all lets one decompression bomb in
+    # the downloads folder take gigabytes in every worker. Pillow warns past
+    # the limit and refuses images over twice it.
+    from PIL import Image
+    Image.MAX_IMAGE_PIXELS = int(os.environ.get("VTVIEW_MAX_IMAGE_PIXELS") or DEFAULT_MAX_IMAGE_PIXELS)
+    return Image
+
+def probe_image(path):
+    # Header-only: Image.open parses the header and defers pixel decoding.
+    Image = pil_image()
+    with Image.open(path) as img:
+        orientation = img.getexif().get(0x0112, 1) if "exif" in img.info else 1
+        return ImageMeta(img.width, img.height, img.format, getattr(img, "n_frames", 1), orientation)
+
+class VideoMeta(namedtuple("VideoMeta", "width height format codec duration bitrate")):
+    # Same shape as ImageMeta where it matters (display_size, megapixels,
+    # aspect, format) so sorts and filters work across both kinds of file.
+    __slots__ = ()
+    frames = None
+
+    @property
+    def display_size(self):
+        return self.width, self.height
+
+    @property
+    def megapixels(self):
+        return self.width * self.height / 1_000_000
+
+    @property
+    def aspect(self):
+        return self.width / self.height if self.height else 0
+
+VIDEO_CODECS = {
+    "avc1": "h264", "avc3": "h264", "h264": "h264", "x264": "h264",
+    "hvc1": "hevc", "hev1": "hevc", "hevc": "hevc", "h265": "hevc",
+    "vp08": "vp8", "vp09": "vp9", "av01": "av1", "mp4v": "mpeg4",
+    "xvid": "mpeg4", "divx": "mpeg4", "dx50": "mpeg4", "fmp4": "mpeg4",
+    "mjpg": "mjpeg", "jpeg": "mjpeg", "apcn": "prores", "apch": "prores",
+    "v_mpeg4/iso/avc": "h264", "v_mpegh/iso/hevc": "hevc", "v_vp8": "vp8",
+    "v_vp9": "vp9", "v_av1": "av1", "v_mpeg4/iso/asp": "mpeg4", "v_mjpeg": "mjpeg",
+}
+
+def codec_name(raw):
+    raw = raw.strip("\x00 ").lower()
+    return VIDEO_CODECS.get(raw, raw)
+
+class _ProbeDone(Exception):
+    pass
+
+# The _probe_* parsers return (width, height, codec, duration) for the first
+# video track, NO_VIDEO_TRACK when the header parses but has no video (audio-
+# only files), or None when the header can't be read at all.
+NO_VIDEO_TRACK = ()
+
+_MP4_CONTAINERS = (b"moov", b"trak", b"mdia", b"minf", b"stbl")
+
+def _probe_mp4(f, file_size):
+    # Walk the box tree by seeking over box bodies; only mvhd, tkhd, hdlr and
+    # the first stsd entry are read, so mdat and the sample tables never are.
+    movie, tracks = {}, []
+
+    def walk(pos, end, top):
+        while pos + 8 <= end:
+            f.seek(pos)
+            size, kind = struct.unpack(">I4s", f.read(8))
+            header = 8
+            if size == 1:
+                size, header = struct.unpack(">Q", f.read(8))[0], 16
+            elif size == 0:
+                size = end - pos
+            if size < header:
+                return
+            body = pos + header
+            if kind in _MP4_CONTAINERS:
+                if kind == b"trak":
+                    tracks.append({})
+                walk(body, pos + size, False)
+                if kind == b"moov":
+                    raise _ProbeDone
+            elif top and not kind.isalnum():
+                return  # Not an ISO media file after all
+            elif kind == b"mvhd":
+                data = f.read(32)
+                if data[0] == 1:
+                    movie["timescale"], movie["duration"] = struct.unpack(">IQ", data[20:32])
+                else:
+                    movie["timescale"], movie["duration"] = struct.unpack(">II", data[12:20])
+            elif kind == b"tkhd" and tracks and size - header <= 104:
+                data = f.read(size - header)
+                width, height = struct.unpack(">II", data[-8:])
+                tracks[-1]["size"] = (width >> 16, height >> 16)
+            elif kind == b"hdlr" and tracks:
+                tracks[-1]["handler"] = f.read(12)[8:12]
+            elif kind == b"stsd" and tracks:
+                data = f.read(44)
+                if len(data) >= 16:
+                    tracks[-1]["codec"] = data[12:16].decode("latin-1")
+                if len(data) == 44:
+                    tracks[-1]["entry_size"] = struct.unpack(">HH", data[40:44])
+            pos += size
+
+    try:
+        walk(0, file_size, True)
+    except _ProbeDone:
+        pass
+    if not movie.get("timescale") or not tracks:
+        return None
+    video = next((t for t in tracks if t.get("handler") == b"vide"), None)
+    if video is None:
+        return NO_VIDEO_TRACK
+    width, height = video.get("size", (0, 0))
+    if not width or not height:
+        width, height = video.get("entry_size", (0, 0))
+    return width, height, codec_name(video.get("codec", "")), movie["duration"] / movie["timescale"]
+
+_EBML_HEADER, _EBML_DOCTYPE = 0x1A45DFA3, 0x4282
+_MKV_SEGMENT, _MKV_INFO, _MKV_TRACKS, _MKV_CLUSTER = 0x18538067, 0x1549A966, 0x1654AE6B, 0x1F43B675
+_MKV_TRACK_ENTRY, _MKV_VIDEO = 0xAE, 0xE0
+_MKV_TIMESCALE, _MKV_DURATION = 0x2AD7B1, 0x4489
+_MKV_TRACK_TYPE, _MKV_CODEC_ID, _MKV_WIDTH, _MKV_HEIGHT = 0x83, 0x86, 0xB0, 0xBA
+_MKV_MASTERS = (_EBML_HEADER, _MKV_SEGMENT, _MKV_INFO, _MKV_TRACKS, _MKV_TRACK_ENTRY, _MKV_VIDEO)
+
+def _read_vint(f, keep_marker):
+    # EBML variable-length integer: the count of leading zero bits in the
+    # first byte gives the length. Sizes of all ones mean "unknown".
+    first = f.read(1)
+    if not first:
+        raise _ProbeDone
+    mask, length = 0x80, 1
+    while length <= 8 and not first[0] & mask:
+        mask >>= 1
+        length += 1
+    if length > 8:
+        raise ValueError("bad EBML vint")
+    value = first[0] if keep_marker else first[0] & (mask - 1)
+    for byte in f.read(length - 1):
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        return None
+    return value
+
+def _probe_matroska(f, file_size):
+    # Header elements (Info, Tracks) precede the first Cluster in every muxer
+    # that matters, so stop there rather than walking the media data.
+    info, tracks = {"doctype": "matroska", "timescale": 1_000_000}, []
+
+    def walk(end):
+        while f.tell() < end:
+            element = _read_vint(f, True)
+            size = _read_vint(f, False)
+            start = f.tell()
+            stop = file_size if size is None else min(start + size, file_size)
+            if element == _MKV_CLUSTER:
+                raise _ProbeDone
+            if element in _MKV_MASTERS:
+                if element == _MKV_TRACK_ENTRY:
+                    tracks.append({})
+                walk(stop)
+            elif element in (_EBML_DOCTYPE, _MKV_TIMESCALE, _MKV_DURATION) or (
+                    tracks and element in (_MKV_TRACK_TYPE, _MKV_CODEC_ID, _MKV_WIDTH, _MKV_HEIGHT)):
+                data = f.read(min(stop - start, 256))
+                if element == _EBML_DOCTYPE:
+                    info["doctype"] = data.rstrip(b"\x00").decode("latin-1")
+                elif element == _MKV_CODEC_ID:
+                    tracks[-1]["codec"] = data.rstrip(b"\x00").decode("latin-1")
+                elif element == _MKV_DURATION:
+                    info["duration"] = struct.unpack(">f" if len(data) == 4 else ">d", data)[0]
+                else:
+                    value = int.from_bytes(data, "big")
+                    if element == _MKV_TIMESCALE:
+                        info["timescale"] = value
+                    else:
+                        tracks[-1][element] = value
+            if size is None:
+                return
+            f.seek(stop)
+
+    f.seek(0)
+    if f.read(4) != b"\x1a\x45\xdf\xa3":
+        return None
+    f.seek(0)
+    try:
+        walk(file_size)
+    except _ProbeDone:
+        pass
+    if not tracks:
+        return None
+    video = next((t for t in tracks if t.get(_MKV_TRACK_TYPE) == 1), None)
+    if video is None:
+        return NO_VIDEO_TRACK
+    duration = info.get("duration", 0) * info["timescale"] / 1e9
+    return (video.get(_MKV_WIDTH, 0), video.get(_MKV_HEIGHT, 0),
+            codec_name(video.get("codec", "")), duration, info["doctype"])
+
+def _probe_avi(f, file_size):
+    # RIFF chunks up to the movi list: avih gives frame count and rate, the
+    # video stream's strf (BITMAPINFOHEADER) gives the compression fourcc.
+    # avih only counts the first RIFF segment of an OpenDML (>1 GB) file, so
+    # the total in odml/dmlh wins when there is one.
+    header, stream = {}, {}
+
+    def walk(pos, end):
+        while pos + 8 <= end:
+            f.seek(pos)
+            kind, size = struct.unpack("<4sI", f.read(8))
+            if kind == b"LIST":
+                list_type = f.read(4)
+                if list_type == b"movi":
+                    raise _ProbeDone
+                if list_type in (b"hdrl", b"strl", b"odml"):
+                    walk(pos + 12, pos + 8 + size)
+            elif kind == b"avih":
+                fields = struct.unpack("<10I", f.read(40))
+                header["usec"], header["frames"], header["size"] = fields[0], fields[4], fields[8:10]
+            elif kind == b"dmlh" and size >= 4:
+                header["total_frames"] = struct.unpack("<I", f.read(4))[0]
+            elif kind == b"strh":
+                stream["type"], handler = struct.unpack("<4s4s", f.read(8))
+                if stream["type"] == b"vids":
+                    stream["codec"] = handler.decode("latin-1")
+                    stream["video"] = True
+            elif kind == b"strf" and stream.get("type") == b"vids":
+                data = f.read(20)
+                compression = data[16:20].decode("latin-1")
+                if compression.strip("\x00 "):
+                    stream["codec"] = compression
+                stream["type"] = b"done"  # first video stream only
+            pos += 8 + size + (size & 1)
+
+    f.seek(0)
+    riff = f.read(12)
+    if riff[:4] != b"RIFF" or riff[8:12] != b"AVI ":
+        return None
+    try:
+        walk(12, file_size)
+    except _ProbeDone:
+        pass
+    if "usec" not in header:
+        return None
+    if not stream.get("video"):
+        return NO_VIDEO_TRACK
+    width, height = header["size"]
+    frames = header.get("total_frames") or header["frames"]
+    return width, height, codec_name(stream.get("codec", "")), frames * header["usec"] / 1_000_000
+
+def _probe_container(path):
+    # (parsed, format, file size), parsed as the _probe_* parsers return it
+    file_size = os.path.getsize(path)
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "rb") as f:
+        if ext == ".avi":
+            parsed, fmt = _probe_avi(f, file_size), "AVI"
+        elif ext in (".mkv", ".webm", ".mka"):
+            parsed, fmt = _probe_matroska(f, file_size), "MKV"
+            if parsed:
+                parsed, fmt = parsed[:4], "WEBM" if parsed[4] == "webm" else "MKV"
+        else:
+            parsed, fmt = _probe_mp4(f, file_size), "MOV" if ext == ".mov" else "MP4"
+    return parsed, fmt, file_size
+
+def probe_video(path):
+    # Container headers only, in pure Python: a few KB are read even for
+    # multi-gigabyte files because everything else is skipped with seeks.
+    # Returns None for containers that aren't understood or have no video.
+    parsed, fmt, file_size = _probe_container(path)
+    if not parsed:
+        return None
+    width, height, codec, duration = parsed
+    bitrate = int(file_size * 8 / duration) if duration > 0 else 0
+    return VideoMeta(width, height, fmt, codec, duration, bitrate)
+
+def check_video(path):
+    # Structural check of the container: every top-level box or chunk must
+    # fit inside the file, which is what an interrupted download breaks.
+    file_size = os.path.getsize(path)
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "rb") as f:
+        if ext == ".avi":
+            head = f.read(12)
+            if len(head) < 12 or head[:4] != b"RIFF":
+                return "not a RIFF file"
+            if 8 + struct.unpack("<I", head[4:8])[0] > file_size:
+                return "truncated: RIFF size exceeds file"
+        elif ext in (".mkv", ".webm", ".mka"):
+            try:
+                if _read_vint(f, True) != _EBML_HEADER:
+                    return "not a Matroska file"
+                f.seek(_read_vint(f, False), os.SEEK_CUR)
+                if _read_vint(f, True) != _MKV_SEGMENT:
+                    return "missing Segment element"
+                size = _read_vint(f, False)
+                end = file_size if size is None else f.tell() + size
+                if end > file_size:
+                    return "truncated: Segment extends past end of file"
+                # Top-level children (Clusters mostly) must tile the Segment;
+                # an unknown-size child ends the check.
+                while f.tell() < end:
+                    _read_vint(f, True)
+                    size = _read_vint(f, False)
+                    if size is None:
+                        break
+                    if f.tell() + size > end:
+                        return "truncated: element extends past end of Segment"
+                    f.seek(size, os.SEEK_CUR)
+            except _ProbeDone:
+                return "truncated element header"
+        elif ext in (".mp4", ".mov", ".m4v"):
+            pos, kinds = 0, set()
+            while pos < file_size:
+                f.seek(pos)
+                header = f.read(8)
+                if len(header) < 8:
+                    return "trailing bytes after last box"
+                size, kind = struct.unpack(">I4s", header)
+                if size == 1:
+                    size = struct.unpack(">Q", f.read(8).rjust(8, b"\0"))[0]
+                elif size == 0:
+                    size = file_size - pos
+                if not kind.isalnum():
+                    return "invalid box header"
+                if size < 8 or pos + size > file_size:
+                    return f"truncated {kind.decode('latin-1')} box"
+                kinds.add(kind)
+                pos += size
+            if b"moov" not in kinds:
+                return "missing moov box"
+        else:
+            return None  # No structural check for this container
+    # Audio-only files are fine; only a header that can't be parsed is not
+    if _probe_container(path)[0] is None:
+        return "unreadable container header"
+    return None
+
+def check_file(path, is_video):
+    # Integrity check run in a worker process: images are fully decoded,
+    # every frame of animations included. Returns None for a sound file,
+    # otherwise a short reason.
+    if is_video:
+        try:
+            return check_video(path)
+        except Exception as e:
+            return str(e) or type(e).__name__
+    Image = pil_image()  # outside the try: no PIL is not a broken file
+    try:
+        with Image.open(path) as img:
+            for frame in range(getattr(img, "n_frames", 1)):
+                img.seek(frame)
+                img.load()
+    except Image.DecompressionBombError:
+        return None  # too large to check under max_image_pixels, not broken
+    except Exception as e:
+        return str(e) or type(e).__name__
+    return None
+
+def encode_meta(meta):
+    # Cache rows are tagged so image and video results share one table
+    if meta is None:
+        return None
+    return {"video" if isinstance(meta, VideoMeta) else "image": list(meta)}
+
+def decode_meta(value):
+    if not value:
+        return None
+    if "video" in value:
+        return VideoMeta(*value["video"])
+    return ImageMeta(*value["image"])
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def get_extensions(config):
+    # (supported formats, video extensions) from [Settings], lowercase with a
+    # leading dot; the window, --serve and --contact-sheet all read them here
+    def normalize(raw):
+        exts = (e.strip().lower() for e in raw.split(","))
+        return tuple(e if e.startswith(".") else f".{e}" for e in exts if e)
+
+    return (normalize(config.get("Settings", "extensions", fallback=".jpg,.jpeg,.gif,.webp,.png")),
+            normalize(config.get("Settings", "videoextensions", fallback=".mp4,.avi,.webm")))
+
+def get_cache_dir(config):
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = config.get("Settings", "cache_dir", fallback=os.path.join(base, "vtview"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+class FileCache:
+    # Per-file results in a sqlite table, keyed by folder and name. A row is
+    # only trusted while the file's mtime and size still match. Connections
+    # are opened per call so background threads can share one instance.
+    def __init__(self, db_path, table):
+        self.db_path = db_path
+        self.table = table
+
+    def connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} (folder TEXT, name TEXT, mtime REAL, "
+            "size INTEGER, value TEXT, PRIMARY KEY (folder, name))"
+        )
+        return db
+
+    @staticmethod
+    def folder_key(folder):
+        return os.path.normcase(os.path.abspath(folder))
+
+    def load_folder(self, folder):
+        db = self.connect()
+        try:
+            rows = db.execute(
+                f"SELECT name, mtime, size, value FROM {self.table} WHERE folder = ?",
+                (self.folder_key(folder),)
+            ).fetchall()
+        finally:
+            db.close()
+        return {name: (mtime, size, json.loads(value)) for name, mtime, size, value in rows}
+
+    def store(self, folder, rows):
+        key = self.folder_key(folder)
+        db = self.connect()
+        try:
+            with db:
+                db.executemany(
+                    f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?)",
+                    [(key, name, mtime, size, json.dumps(value)) for name, mtime, size, value in rows]
+                )
+        finally:
+            db.close()
+
+_meta_query_re = re.compile(r"^(w|h|mp|ar|frames|fmt|dur|codec|kbps)(>=|<=|!=|=|>|<)(.+)$")
+
+QUERY_OPERATORS = {
+    ">": operator.gt, ">=": operator.ge, "<": operator.lt,
+    "<=": operator.le, "=": operator.eq, "!=": operator.ne,
+}
+
+META_FIELDS = {
+    "w": lambda m: m.display_size[0],
+    "h": lambda m: m.display_size[1],
+    "mp": lambda m: m.megapixels,
+    "ar": lambda m: m.aspect,
+    "frames": lambda m: m.frames,
+    "fmt": lambda m: (m.format or "").lower(),
+    "dur": lambda m: getattr(m, "duration", None),
+    "codec": lambda m: getattr(m, "codec", None),
+    "kbps": lambda m: m.bitrate / 1000 if isinstance(m, VideoMeta) else None,
+}
+
+def _meta_filter(meta, get, compare, value):
+    # Fields a file doesn't have (dur on an image) never match
+    field = get(meta) if meta is not None else None
+    return field is not None and compare(field, value)
+
+def parse_query(text):
+    # Split a search string into plain substring terms and metadata filters
+    # such as "w>3000", "ar<1", "fmt=png" or, for videos, "dur>60" and
+    # "codec=hevc".
+    terms, filters = [], []
+    for term in text.strip().lower().split():
+        match = _meta_query_re.match(term)
+        if not match:
+            terms.append(term)
+            continue
+        field, op, value = match.groups()
+        if field not in ("fmt", "codec"):
+            try:
+                value = float(value)
+            except ValueError:
+                terms.append(term)
+                continue
+        get, compare = META_FIELDS[field], QUERY_OPERATORS[op]
+        filters.append(partial(_meta_filter, get=get, compare=compare, value=value))
+    return terms, filters
+
+def open_image(path):
+    Image = pil_image()
+    img = Image.open(path)
+    if getattr(img, "is_animated", False):
+        # Multi-frame images keep their file handle open between seeks; read
+        # them into memory so the file can still be renamed or moved.
+        img.close()
+        with open(path, "rb") as f:
+            img = Image.open(io.BytesIO(f.read()))
+    img.load()
+    return img
+
+# Decoder backends. Each returns (image, source size, animated) with the image
+# reduced as far as the library can during decode while staying at least as
+# large as the size that fits box; decode_image does the final scaling.
+# Only Pillow handles animation, so the others are given still images only.
+
+DecodedImage = namedtuple("DecodedImage", "image source_size animated")
+DecoderBackend = namedtuple("DecoderBackend", "load extensions decode")
+JPEG_EXTS = (".jpg", ".jpeg")
+
+def _decode_pillow(path, box):
+    Image = pil_image()
+    img = Image.open(path)
+    source_size = img.size
+    animated = getattr(img, "is_animated", False)
+    if animated:
+        img.close()
+        img = open_image(path)
+    elif box and img.format == "JPEG":
+        img.draft(img.mode, fit_size(*source_size, *box))  # 1/2, 1/4 or 1/8 in the decoder
+    img.load()
+    return img, source_size, animated
+
+_turbojpeg = None
+
+def _load_turbojpeg():
+    # The Python package imports fine without libturbojpeg; TurboJPEG()
+    # is what finds and loads the library
+    global _turbojpeg
+    if _turbojpeg is None:
+        from turbojpeg import TurboJPEG
+        _turbojpeg = TurboJPEG()
+
+def _load_pyvips():
+    import pyvips  # raises when libvips can't be loaded
+    pyvips.version(0)
+
+def _decode_turbojpeg(path, box):
+    Image = pil_image()
+    from turbojpeg import TJPF_RGB
+    _load_turbojpeg()
+    with open(path, "rb") as f:
+        data = f.read()
+    width, height, _, _ = _turbojpeg.decode_header(data)
+    scale = None
+    if box:
+        target_w, target_h = fit_size(width, height, *box)
+        # Smallest DCT scaling factor that still covers the fitted size
+        for num, den in sorted(_turbojpeg.scaling_factors, key=lambda f: f[0] / f[1]):
+            if num <= den and -(-width * num // den) >= target_w and -(-height * num // den) >= target_h:
+                scale = (num, den)
+                break
+    pixels = _turbojpeg.decode(data, pixel_format=TJPF_RGB, scaling_factor=scale)
+    return Image.fromarray(pixels), (width, height), False
+
+def _decode_pyvips(path, box):
+    import pyvips
+    Image = pil_image()
+    if box:
+        header = pyvips.Image.new_from_file(path)  # lazy: reads the header only
+        source_size = (header.width, header.height)
+        target_w, target_h = fit_size(*source_size, *box)
+        img = pyvips.Image.thumbnail(path, target_w, height=target_h, size="down", no_rotate=True)
+    else:
+        img = pyvips.Image.new_from_file(path, access="sequential")
+        source_size = (img.width, img.height)
+    if img.interpretation not in ("srgb", "b-w"):
+        img = img.colourspace("srgb")
+    if img.format == "ushort":
+        img = img >> 8
+    if img.format != "uchar":
+        img = img.cast("uchar")
+    mode = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}[img.bands]
+    return Image.frombytes(mode, (img.width, img.height), img.write_to_memory()), source_size, False
+
+DECODER_BACKENDS = OrderedDict([
+    ("turbojpeg", DecoderBackend(_load_turbojpeg, JPEG_EXTS, _decode_turbojpeg)),
+    ("pyvips", DecoderBackend(_load_pyvips, JPEG_EXTS + (".png", ".webp"), _decode_pyvips)),
+    ("pillow", DecoderBackend(pil_image, None, _decode_pillow)),
+])
+
+_installed_decoders = None
+
+def installed_decoders():
+    # Backends that actually load here, native library included. Worked out
+    # once per process: a failed import isn't cheap and won't start working.
+    global _installed_decoders
+    if _installed_decoders is None:
+        _installed_decoders = []
+        for name, backend in DECODER_BACKENDS.items():
+            try:
+                backend.load()
+            except Exception:
+                continue
+            _installed_decoders.append(name)
+    return list(_installed_decoders)
+
+def _finish_decode(img, source_size, box):
+    Image = pil_image()
+    if img.mode not in ("RGB", "RGBA"):
+        # Before resizing: palette images would otherwise be scaled NEAREST
+        has_alpha = "A" in img.getbands() or "transparency" in img.info
+        img = img.convert("RGBA" if has_alpha else "RGB")
+    if box:
+        size = fit_size(*source_size, *box)
+        if img.size != size:
+            img = img.resize(size, Image.LANCZOS)
+    return img
+
+def decode_image(path, box=None, backend="pillow"):
+    # Decode path and, with a box, scale it to fit. A backend that fails
+    # (missing library, CMYK JPEG, ...) is retried with Pillow, which also
+    # produces the error message for files that are really broken.
+    decode = DECODER_BACKENDS.get(backend, DECODER_BACKENDS["pillow"]).decode
+    try:
+        img, source_size, animated = decode(path, box)
+    except Exception:
+        if decode is _decode_pillow:
+            raise
+        img, source_size, animated = _decode_pillow(path, box)
+    return DecodedImage(_finish_decode(img, source_size, box), source_size, animated)
+
+def benchmark_decoders(samples, box, backends, repeats=3):
+    # Time every usable backend on one sample file per extension, decode and
+    # final scaling included, and pick the fastest. A backend that fails on
+    # the sample is left out for that extension.
+    choice, timings = {}, {}
+    for ext, path in samples.items():
+        results = {}
+        for name in backends:
+            backend = DECODER_BACKENDS[name]
+            if backend.extensions is not None and ext not in backend.extensions:
+                continue
+            try:
+                backend.decode(path, box)  # warm-up: imports and library setup
+                best = float("inf")
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    img, source_size, _ = backend.decode(path, box)
+                    _finish_decode(img, source_size, box)
+                    best = min(best, time.perf_counter() - start)
+            except Exception:
+                continue
+            results[name] = best
+        if results:
+            choice[ext] = min(results, key=results.get)
+            timings[ext] = results
+    return choice, timings
+
+class TilePyramid:
+    # Multi-resolution view of one image. Level k is the source reduced by
+    # 2**k; tiles are cut from a level on demand and cached LRU under a pixel
+    # budget, and only a couple of level images are kept decoded at a time.
+    def __init__(self, path, tile_size=256, max_pixels=32_000_000, max_levels=2):
+        Image = pil_image()
+        self.path = path
+        self.tile_size = tile_size
+        self.max_pixels = max_pixels
+        self.cached_pixels = 0
+        self.max_levels = max_levels
+        with Image.open(path) as img:
+            self.width, self.height = img.size
+        self.top_level = 0
+        while max(self.width, self.height) >> self.top_level > tile_size:
+            self.top_level += 1
+        self.levels = OrderedDict()
+        self.tiles = OrderedDict()
+
+    def level_size(self, level):
+        f = 1 << level
+        return (self.width + f - 1) // f, (self.height + f - 1) // f
+
+    def level_for_scale(self, scale):
+        if scale >= 1:
+            return 0
+        return min(self.top_level, int(math.log2(1 / scale)))
+
+    def level_image(self, level):
+        if level in self.levels:
+            self.levels.move_to_end(level)
+            return self.levels[level]
+        Image = pil_image()
+        size = self.level_size(level)
+        finer = [k for k in self.levels if k < level]
+        if finer:
+            nearest = max(finer)
+            img = self.levels[nearest].reduce(1 << (level - nearest))
+        else:
+            img = Image.open(self.path)
+            img.draft("RGB", size)  # JPEG decodes at 1/2, 1/4 or 1/8 directly
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+            if img.size != size:
+                img = img.resize(size, Image.LANCZOS)
+        self.levels[level] = img
+        while len(self.levels) > self.max_levels:
+            self.levels.popitem(last=False)
+        return img
+
+    def tile(self, level, tx, ty, width, height):
+        key = (level, tx, ty, width, height)
+        photo = self.tiles.get(key)
+        if photo is not None:
+            self.tiles.move_to_end(key)
+            return photo
+        Image = pil_image()
+        from PIL import ImageTk
+        img = self.level_image(level)
+        t = self.tile_size
+        box = (tx * t, ty * t, min((tx + 1) * t, img.width), min((ty + 1) * t, img.height))
+        region = img.crop(box)
+        if region.size != (width, height):
+            region = region.resize((width, height), Image.BILINEAR)
+        photo = ImageTk.PhotoImage(region)
+        self.tiles[key] = photo
+        self.cached_pixels += width * height
+        while self.cached_pixels > self.max_pixels and len(self.tiles) > 1:
+            (_, _, _, w, h), _ = self.tiles.popitem(last=False)
+            self.cached_pixels -= w * h
+        return photo
+
+class TileView:
+    # Zoom/pan state for the preview canvas. Tiles are placed in "world"
+    # pixels (source pixels * scale) so a pan is a canvas move plus drawing
+    # whatever tiles just scrolled into view.
+    def __init__(self, canvas, path):
+        self.canvas = canvas
+        self.pyramid = TilePyramid(path)
+        self.items = {}
+        self.fit_scale = 1.0
+        self.scale = 1.0
+        self.view_x = 0
+        self.view_y = 0
+        self.fit()
+
+    def fit(self):
+        cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
+        p = self.pyramid
+        self.fit_scale = min(cw / p.width, ch / p.height)
+        self.scale = self.fit_scale
+        self.clamp()
+        self.redraw(full=True)
+
+    def resize(self):
+        # New canvas size: stay fitted if we were, otherwise keep the zoom
+        # (but never below the new fit) and the view inside the image
+        cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
+        p = self.pyramid
+        fitted = self.scale <= self.fit_scale
+        self.fit_scale = min(cw / p.width, ch / p.height)
+        if fitted or self.scale < self.fit_scale:
+            return self.fit()
+        self.clamp()
+        self.redraw(full=True)
+
+    def clamp(self):
+        # Keep the view on the image; an axis smaller than the canvas is centred
+        cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
+        w = round(self.pyramid.width * self.scale)
+        h = round(self.pyramid.height * self.scale)
+        self.view_x = round((w - cw) / 2) if w <= cw else max(0, min(self.view_x, w - cw))
+        self.view_y = round((h - ch) / 2) if h <= ch else max(0, min(self.view_y, h - ch))
+
+    def zoom_at(self, x, y, factor):
+        new_scale = max(self.fit_scale, min(8.0, self.scale * factor))
+        if new_scale == self.scale:
+            return
+        # Keep the source pixel under the cursor fixed
+        src_x = (self.view_x + x) / self.scale
+        src_y = (self.view_y + y) / self.scale
+        self.scale = new_scale
+        self.view_x = round(src_x * new_scale - x)
+        self.view_y = round(src_y * new_scale - y)
+        self.clamp()
+        self.redraw(full=True)
+
+    def pan(self, dx, dy):
+        old_x, old_y = self.view_x, self.view_y
+        self.view_x -= dx
+        self.view_y -= dy
+        self.clamp()
+        dx, dy = old_x - self.view_x, old_y - self.view_y
+        if dx or dy:
+            self.canvas.move("tile", dx, dy)
+            self.redraw()
+
+    def redraw(self, full=False):
+        if full:
+            self.canvas.delete("all")
+            self.items.clear()
+        p = self.pyramid
+        level = p.level_for_scale(self.scale)
+        step = p.tile_size * (1 << level) * self.scale  # world px per tile
+        lw, lh = p.level_size(level)
+        cols = (lw + p.tile_size - 1) // p.tile_size
+        rows = (lh + p.tile_size - 1) // p.tile_size
+        cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
+        tx0 = max(0, int(self.view_x // step))
+        ty0 = max(0, int(self.view_y // step))
+        tx1 = min(cols, int((self.view_x + cw) // step) + 1)
+        ty1 = min(rows, int((self.view_y + ch) // step) + 1)
+        visible = set()
+        for ty in range(ty0, ty1):
+            for tx in range(tx0, tx1):
+                visible.add((tx, ty))
+                if (tx, ty) in self.items:
+                    continue
+                wx0, wy0 = round(tx * step), round(ty * step)
+                wx1 = round(min((tx + 1) * step, p.width * self.scale))
+                wy1 = round(min((ty + 1) * step, p.height * self.scale))
+                if wx1 <= wx0 or wy1 <= wy0:
+                    continue
+                photo = p.tile(level, tx, ty, wx1 - wx0, wy1 - wy0)
+                self.items[(tx, ty)] = (self.canvas.create_image(
+                    wx0 - self.view_x, wy0 - self.view_y,
+                    anchor=tk.NW, image=photo, tags="tile"
+                ), photo)
+        for key in [k for k in self.items if k not in visible]:
+            self.canvas.delete(self.items.pop(key)[0])
+
+class IngestService:
+    # Watches one folder (normally default_folder) and, once a file has stopped
+    # growing for settle_seconds, scrubs its tags and tosses it using the same
+    # rules as Alt-T. Work runs on a small thread pool; every action is
+    # appended to a tab-separated log so it can be reviewed afterwards.
+    def __init__(self, folder, dirs, supported_formats, video_exts, log_path,
+                 poll_seconds=5.0, settle_seconds=10.0, workers=2, on_change=None):
+        from concurrent.futures import ThreadPoolExecutor
+        self.folder = folder
+        self.dirs = dirs
+        self.supported_formats = supported_formats
+        self.video_exts = video_exts
+        self.log_path = log_path
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.on_change = on_change
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self.log_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.seen = {}  # name -> (size, mtime, time the size was last seen changing)
+        self.in_flight = set()
+        self.handled = {}  # name -> (size, mtime) already processed and left in place
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.pool.shutdown(wait=False)
+
+    def log(self, action, name, detail=""):
+        line = f"{time.strftime('%Y-%m-%d %H:%M:%S')}\t{action}\t{name}\t{detail}\n"
+        with self.log_lock:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def run(self):
+        while not self.stopped.wait(self.poll_seconds):
+            try:
+                self.poll()
+            except Exception as e:
+                self.log("error", self.folder, str(e))
+
+    def poll(self):
+        now = time.monotonic()
+        current = {}
+        with os.scandir(self.folder) as it:
+            for dir_entry in it:
+                if dir_entry.name.lower().endswith(self.supported_formats) and dir_entry.is_file():
+                    stat = dir_entry.stat()
+                    current[dir_entry.name] = (stat.st_size, stat.st_mtime)
+        for name in list(self.seen):
+            if name not in current:
+                del self.seen[name]
+        for name in list(self.handled):
+            if self.handled[name] != current.get(name):
+                del self.handled[name]
+
+        for name, (size, mtime) in current.items():
+            previous = self.seen.get(name)
+            if not previous or previous[:2] != (size, mtime):
+                self.seen[name] = (size, mtime, now)
+                continue
+            if now - previous[2] < self.settle_seconds or size == 0:
+                continue
+            if name in self.in_flight or name in self.handled:
+                continue
+            with self.log_lock:
+                self.in_flight.add(name)
+            self.pool.submit(self.process, name, (size, mtime))
+
+    def process(self, name, signature):
+        changed = False
+        try:
+            src = os.path.join(self.folder, name)
+            new_name = scrub_filename(name)
+            if new_name != name:
+                dst = os.path.join(self.folder, new_name)
+                if os.path.exists(dst):
+                    self.log("skip", name, f"{new_name} already exists")
+                    new_name = name
+                else:
+                    os.rename(src, dst)
+                    self.log("scrub", name, new_name)
+                    src, changed = dst, True
+
+            record = FileRecord(new_name, None, self.video_exts)
+            target_dir = toss_target(record, *self.dirs)
+            if not target_dir:
+                self.log("keep", new_name, "no matching model folder")
+                with self.log_lock:
+                    self.handled[new_name] = signature
+                return
+            dest = os.path.join(target_dir, new_name)
+            if os.path.exists(dest):
+                self.log("skip", new_name, f"{dest} already exists")
+                with self.log_lock:
+                    self.handled[new_name] = signature
+                return
+            shutil.move(src, dest)
+            self.log("toss", new_name, dest)
+            changed = True
+        except Exception as e:
+            self.log("error", name, str(e))
+        finally:
+            with self.log_lock:
+                self.in_flight.discard(name)
+            if changed and self.on_change:
+                self.on_change()
+
+def fit_size(width, height, box_width, box_height):
+    img_ratio = width / height
+    if img_ratio > box_width / box_height:
+        return box_width, max(1, int(box_width / img_ratio))
+    return max(1, int(box_height * img_ratio)), box_height
+
+def attach_shared_memory(name):
+    from multiprocessing import shared_memory
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 has no track flag
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            # Otherwise the worker's resource tracker unlinks the UI's slot
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+def decode_into_shared_memory(path, box, shm_name, capacity, backend="pillow"):
+    # Runs in a worker process: decode, scale to fit box and copy the pixels
+    # into the UI-owned slot. Only (mode, size, animated) is pickled back.
+    img, _, animated = decode_image(path, box, backend)
+    size = img.size
+    data = img.tobytes()
+    if len(data) > capacity:
+        raise ValueError("decoded frame does not fit the shared slot")
+    shm = attach_shared_memory(shm_name)
+    try:
+        shm.buf[:len(data)] = data
+    finally:
+        shm.close()
+    return img.mode, size, animated
+
+class DecodeService:
+    # Process pool for decode + LANCZOS scaling. The UI owns a fixed set of
+    # shared-memory slots; a worker writes a finished frame into a slot and
+    # the UI wraps that buffer with Image.frombuffer to build the PhotoImage,
+    # so pixel data is never pickled. Frames decoded ahead (prefetch) wait in
+    # their slot until they are shown or evicted. Only the newest request for
+    # something on screen matters: it cancels older work that hasn't started,
+    # and if every slot is still busy it waits, replacing any older waiter.
+    def __init__(self, post, workers, slot_bytes, slots, choose_backend=None):
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import shared_memory
+        self.post = post
+        self.choose_backend = choose_backend or (lambda path: "pillow")
+        self.slot_bytes = slot_bytes
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.slots = [shared_memory.SharedMemory(create=True, size=slot_bytes) for _ in range(slots)]
+        self.free = list(self.slots)
+        self.ready = OrderedDict()  # key -> (shm, mode, size, animated)
+        self.in_flight = {}  # key -> (shm, [callbacks], future)
+        self.waiting = None  # (path, box, callback) waiting for a free slot
+
+    def request(self, path, box, callback=None):
+        # Requests with a callback are for the image on screen and are always
+        # accepted. Prefetches (no callback) return False when every slot is busy.
+        key = (path, tuple(box))
+        if key in self.ready:
+            if callback:
+                callback(self.take(key))
+            return True
+        if key in self.in_flight:
+            if callback:
+                self.in_flight[key][1].append(callback)
+            return True
+        if callback:
+            # Everything else in flight was asked for by an earlier selection
+            self.waiting = None
+            for _, _, future in self.in_flight.values():
+                future.cancel()
+        if not self.free and self.ready:
+            _, (shm, _, _, _) = self.ready.popitem(last=False)
+            self.free.append(shm)
+        if not self.free:
+            if not callback:
+                return False
+            self.waiting = (path, box, callback)
+            return True
+        shm = self.free.pop()
+        future = self.pool.submit(
+            decode_into_shared_memory, path, key[1], shm.name, self.slot_bytes, self.choose_backend(path)
+        )
+        self.in_flight[key] = (shm, [callback] if callback else [], future)
+        future.add_done_callback(lambda f: self.post(self.on_done, (key, f)))
+        return True
+
+    def start_waiting(self):
+        if self.waiting and self.free:
+            waiting, self.waiting = self.waiting, None
+            self.request(*waiting)
+
+    def on_done(self, key, future):
+        shm, callbacks, _ = self.in_flight.pop(key)
+        if future.cancelled() or future.exception() is not None:
+            self.free.append(shm)
+            if not future.cancelled():
+                for callback in callbacks:
+                    callback(None)
+            self.start_waiting()
+            return
+        mode, size, animated = future.result()
+        self.ready[key] = (shm, mode, size, animated)
+        if callbacks:
+            result = self.take(key)
+            for callback in callbacks:
+                callback(result)
+
+    def take(self, key):
+        Image = pil_image()
+        from PIL import ImageTk
+        shm, mode, size, animated = self.ready.pop(key)
+        try:
+            count = size[0] * size[1] * len(mode)
+            img = Image.frombuffer(mode, size, shm.buf[:count], "raw", mode, 0, 1)
+            photo = ImageTk.PhotoImage(img)
+            del img
+        finally:
+            self.free.append(shm)
+            self.start_waiting()
+        return photo, animated
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        for shm in self.slots:
+            try:
+                shm.close()
+                shm.unlink()
+            except (OSError, BufferError):
+                pass
+
+class AnimationPlayer:
+    # Plays an animated GIF/WebP. A worker thread decodes frames in order and
+    # pre-scales them into a bounded queue; the Tk side only turns frames into
+    # PhotoImages and schedules the next one from the file's frame durations.
+    # Animations small enough for cache_bytes are kept after the first loop.
+    def __init__(self, root, path, box, show_frame, queue_size=8, cache_bytes=64_000_000):
+        self.root = root
+        self.path = path
+        self.box = box
+        self.show_frame = show_frame
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.cache_bytes = cache_bytes
+        self.cached = None
+        self.stopped = threading.Event()
+        self.after_id = None
+        self.position = 0
+        self.next_due = None
+        threading.Thread(target=self.decode_frames, daemon=True).start()
+        self.after_id = self.root.after(1, self.tick)
+
+    def decode_frames(self):
+        Image = pil_image()
+        try:
+            with open(self.path, "rb") as f:
+                img = Image.open(io.BytesIO(f.read()))
+            n_frames = getattr(img, "n_frames", 1)
+            size = fit_size(img.width, img.height, *self.box)
+            keep = [] if size[0] * size[1] * 4 * n_frames <= self.cache_bytes else None
+            while not self.stopped.is_set():
+                for i in range(n_frames):
+                    if self.stopped.is_set():
+                        return
+                    img.seek(i)
+                    frame = img.convert("RGBA").resize(size, Image.LANCZOS)
+                    duration = img.info.get("duration") or 100
+                    item = (frame, duration if duration >= 20 else 100)
+                    if keep is not None:
+                        keep.append(item)
+                    while not self.stopped.is_set():
+                        try:
+                            self.frames.put(item, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+                if keep is not None:
+                    self.cached = keep
+                    return
+        except Exception:
+            return
+
+    def tick(self):
+        from PIL import ImageTk
+        self.after_id = None
+        if self.stopped.is_set():
+            return
+        if self.cached is not None and self.frames.empty():
+            frame, duration = self.cached[self.position % len(self.cached)]
+            self.position += 1
+        else:
+            try:
+                frame, duration = self.frames.get_nowait()
+            except queue.Empty:
+                self.after_id = self.root.after(10, self.tick)
+                return
+        self.show_frame(ImageTk.PhotoImage(frame))
+        now = time.perf_counter()
+        if self.next_due is None or now - self.next_due > 0.25:
+            self.next_due = now  # resync after a stall instead of racing
+        self.next_due += duration / 1000
+        delay = max(1, int((self.next_due - time.perf_counter()) * 1000))
+        self.after_id = self.root.after(delay, self.tick)
+
+    def stop(self):
+        self.stopped.set()
+        if self.after_id:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+SORT_KEYS = {
+    "Name": lambda r: r.lower,
+    "Natural": lambda r: natural_key(r.name),
+    "Size": lambda r: (r.size, r.lower),
+    "Created": lambda r: (r.ctime, r.lower),
+    "Modified": lambda r: (r.mtime, r.lower),
+    "Priority": lambda r: (r.priority or 6, r.lower),
+    "Tag count": lambda r: (len(r.tags), r.lower),
+    "Model": lambda r: (r.model == "", r.group, r.lower),
+}
+
+META_SORT_KEYS = {
+    "Megapixels": lambda m: m.megapixels,
+    "Aspect ratio": lambda m: m.aspect,
+    "Format": lambda m: m.format or "",
+    "Duration": lambda m: getattr(m, "duration", 0),
+    "Bitrate": lambda m: getattr(m, "bitrate", 0),
+}
 
 def scrub_filename(filename: str) -> str:
     base, ext = os.path.splitext(filename)
-    match = re.search(r"(.*?)(\s*)(#.+)", base)
-    if not match:
+    parsed = split_tags(base)
+    if not parsed:
         return filename
-    root_part = match.group(1).rstrip()
-    tag_part = match.group(3)
-    hashtags = [tag.lower() for tag in re.findall(r"#\w+", tag_part)]
-    priority_tags = {"#1", "#2", "#3", "#4", "#5"}
-    last_priority_tag = None
-    other_tags = []
-    for tag in hashtags:
-        if tag in priority_tags:
-            last_priority_tag = tag
-        else:
-            other_tags.append(tag)
-    unique_other_tags = sorted(set(other_tags))
+    root_part, last_priority_tag, unique_other_tags = parsed
     all_tags = ([last_priority_tag] if last_priority_tag else []) + unique_other_tags
     new_tag_string = "".join(all_tags)
-    return f"{root_part} {new_tag_string}{ext}"
+    return f"{root_part.rstrip()} {new_tag_string}{ext}"
+
+def normalize_tag(tag: str) -> str:
+    # Tags are matched lowercase with their leading '#'; blank stays blank
+    tag = tag.strip().lower()
+    return tag if not tag or tag.startswith("#") else f"#{tag}"
+
+def retag_filename(filename: str, old_tag: str, new_tag: str) -> str:
+    # Replace one whole tag (not a substring of a longer tag) and re-scrub.
+    # An empty new_tag drops the tag; merging into an existing tag dedupes.
+    base, ext = os.path.splitext(filename)
+    parsed = split_tags(base)
+    if not parsed:
+        return filename
+    head, priority, tags = parsed
+    all_tags = ([priority] if priority else []) + tags
+    if old_tag not in all_tags:
+        return filename
+    all_tags = [new_tag if t == old_tag else t for t in all_tags if new_tag or t != old_tag]
+    if not all_tags:
+        return f"{head.rstrip()}{ext}"
+    return scrub_filename(f"{head.rstrip()} {''.join(all_tags)}{ext}")
+
+def plan_tag_rename(roots, old_tag, new_tag, supported_formats, workers=8, progress=None):
+    # Walk every root in parallel (one task per directory) and build the
+    # full rename plan, then check collisions across the whole plan before
+    # anything is touched. Returns (plan, conflicts) as lists of
+    # (folder, src, dst[, reason]).
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    def scan(folder):
+        subdirs, items, names = [], [], set()
+        with os.scandir(folder) as it:
+            for dir_entry in it:
+                name = dir_entry.name
+                if dir_entry.is_dir(follow_symlinks=False):
+                    subdirs.append(dir_entry.path)
+                    continue
+                names.add(os.path.normcase(name))
+                if "#" in name and name.lower().endswith(supported_formats):
+                    new_name = retag_filename(name, old_tag, new_tag)
+                    if new_name != name:
+                        items.append((name, new_name))
+        return folder, subdirs, items, (names if items else None)
+
+    visited = set()
+    plan_by_folder = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+
+        def submit(folder):
+            key = os.path.normcase(os.path.abspath(folder))
+            if key not in visited:
+                visited.add(key)
+                pending.add(pool.submit(scan, folder))
+
+        for root in roots:
+            if os.path.isdir(root):
+                submit(root)
+        scanned = 0
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                scanned += 1
+                try:
+                    folder, subdirs, items, names = future.result()
+                except OSError:
+                    continue
+                for subdir in subdirs:
+                    submit(subdir)
+                if items:
+                    plan_by_folder[folder] = (items, names)
+            if progress:
+                progress(scanned, sum(len(v[0]) for v in plan_by_folder.values()))
+
+    plan, conflicts = [], []
+    for folder, (items, names) in plan_by_folder.items():
+        sources = {os.path.normcase(src) for src, _ in items}
+        targets = {}
+        for src, dst in items:
+            targets.setdefault(os.path.normcase(dst), []).append(src)
+        for src, dst in items:
+            key = os.path.normcase(dst)
+            if len(targets[key]) > 1:
+                conflicts.append((folder, src, dst, "several files would get this name"))
+            elif key in names and key != os.path.normcase(src):
+                reason = "target is renamed too" if key in sources else "target already exists"
+                conflicts.append((folder, src, dst, reason))
+            else:
+                plan.append((folder, src, dst))
+    return plan, conflicts
+
+def apply_tag_plan(plan, journal_path, batch_size=500, progress=None):
+    # Renames run in batches. Each batch is written to the journal and
+    # fsynced before it starts, then each rename gets its own done/fail line,
+    # fsynced as soon as it is written, so after a crash the journal says
+    # exactly which files were renamed.
+    failures = []
+    with open(journal_path, "a", encoding="utf-8") as journal:
+        for start in range(0, len(plan), batch_size):
+            batch = plan[start:start + batch_size]
+            journal.write("".join(f"plan\t{folder}\t{src}\t{dst}\n" for folder, src, dst in batch))
+            journal.flush()
+            os.fsync(journal.fileno())
+            for folder, src, dst in batch:
+                src_path = os.path.join(folder, src)
+                dst_path = os.path.join(folder, dst)
+                try:
+                    if os.path.exists(dst_path) and os.path.normcase(dst) != os.path.normcase(src):
+                        raise FileExistsError(f"{dst} already exists")
+                    os.rename(src_path, dst_path)
+                    journal.write(f"done\t{folder}\t{src}\t{dst}\n")
+                except OSError as e:
+                    failures.append((folder, src, dst, str(e)))
+                    journal.write(f"fail\t{folder}\t{src}\t{dst}\t{e}\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+            if progress:
+                progress(start + len(batch))
+    return failures
+
+def contact_thumbnail(path, cell):
+    # Worker process: reduced-resolution decode (JPEG draft mode scales in
+    # the decoder) down to one contact-sheet cell. None if it can't be read.
+    Image = pil_image()
+    try:
+        with Image.open(path) as img:
+            img.draft("RGB", (cell, cell))
+            img = img.convert("RGB")
+            img.thumbnail((cell, cell))
+            return img.size, img.tobytes()
+    except Exception:
+        return None
+
+def build_contact_sheets(paths, out_dir, prefix, columns=8, rows=8, cell=256,
+                         labels=True, workers=None, progress=None):
+    # Thumbnails are decoded in a process pool and pasted into one sheet at
+    # a time, so memory is bounded by a sheet plus the next batch in flight.
+    Image = pil_image()
+    from PIL import ImageDraw
+    from concurrent.futures import ProcessPoolExecutor
+    per_sheet = columns * rows
+    label_height = 16 if labels else 0
+    max_chars = max(4, cell // 7)
+    batches = [paths[i:i + per_sheet] for i in range(0, len(paths), per_sheet)]
+    written = []
+    done = 0
+    os.makedirs(out_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def submit(batch):
+            return pool.map(contact_thumbnail, batch, [cell] * len(batch), chunksize=4)
+
+        pending = submit(batches[0]) if batches else None
+        for sheet_no, batch in enumerate(batches, 1):
+            results = pending
+            # Keep the workers busy on the next sheet while this one is pasted
+            pending = submit(batches[sheet_no]) if sheet_no < len(batches) else None
+            sheet_rows = (len(batch) + columns - 1) // columns
+            sheet = Image.new("RGB", (columns * cell, sheet_rows * (cell + label_height)), "black")
+            draw = ImageDraw.Draw(sheet)
+            for i, (path, thumb) in enumerate(zip(batch, results)):
+                x = (i % columns) * cell
+                y = (i // columns) * (cell + label_height)
+                if thumb:
+                    size, data = thumb
+                    sheet.paste(Image.frombytes("RGB", size, data), (x + (cell - size[0]) // 2, y + (cell - size[1]) // 2))
+                if labels:
+                    name = os.path.basename(path)
+                    if len(name) > max_chars:
+                        name = name[:max_chars - 1] + "…"
+                    draw.text((x + 4, y + cell + 2), name, fill="white")
+                done += 1
+                if progress:
+                    progress(done)
+            out_path = os.path.join(out_dir, f"{prefix}-{sheet_no:03d}.jpg")
+            sheet.save(out_path, quality=90)
+            written.append(out_path)
+    return written
+
+SIMILARITY_THUMB = 32
+
+def similarity_thumbnail(path):
+    # Worker process: a tiny RGB rendition is all the features need, and
+    # JPEG draft mode does most of the shrinking inside the decoder.
+    Image = pil_image()
+    try:
+        with Image.open(path) as img:
+            img.draft("RGB", (SIMILARITY_THUMB * 4, SIMILARITY_THUMB * 4))
+            img = img.convert("RGB").resize((SIMILARITY_THUMB, SIMILARITY_THUMB), Image.BOX)
+            return img.tobytes()
+    except Exception:
+        return None
+
+def image_features(thumbs):
+    # One float32 row per thumbnail, computed for the whole batch at once:
+    # a 4x4x4 colour histogram (square-rooted so flat backgrounds don't
+    # dominate) and the 8x8 lowest DCT frequencies of the luma, minus the DC
+    # term. Each half is L2-normalised.
+    import numpy as np
+    n, size = len(thumbs), SIMILARITY_THUMB
+    pixels = np.frombuffer(b"".join(thumbs), dtype=np.uint8).reshape(n, size * size, 3)
+    bins = pixels >> 6
+    index = (bins[..., 0].astype(np.int64) * 16 + bins[..., 1] * 4 + bins[..., 2]
+             + np.arange(n)[:, None] * 64)
+    hist = np.sqrt(np.bincount(index.ravel(), minlength=n * 64).reshape(n, 64).astype(np.float32))
+
+    luma = (pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)).reshape(n, size, size)
+    k, i = np.arange(8)[:, None], np.arange(size)[None, :]
+    basis = np.cos(np.pi * (2 * i + 1) * k / (2 * size)).astype(np.float32)
+    dct = (basis @ luma @ basis.T).reshape(n, 64)[:, 1:]
+
+    def normalise(a):
+        return a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-6)
+    return np.hstack([normalise(hist), normalise(dct)]).astype(np.float32)
+
+def similarity_chain(features, neighbours=12, block=512):
+    # Approximate nearest-neighbour chain: starting from row 0, always step
+    # to the closest unvisited image. Candidates come from a k-NN table built
+    # in blocks on PCA-reduced features; only when all of an image's
+    # candidates are taken does the walk fall back to a brute-force search
+    # over the unvisited rows. Returns row indices in walk order.
+    import numpy as np
+    n = len(features)
+    if n < 3:
+        return list(range(n))
+    x = features - features.mean(axis=0)
+    _, _, vt = np.linalg.svd(x[::max(1, n // 4000)], full_matrices=False)
+    x = np.ascontiguousarray(x @ vt[:32].T, dtype=np.float32)
+    sq = (x * x).sum(axis=1)
+    k = min(neighbours, n - 1)
+    knn = np.empty((n, k), dtype=np.int64)
+    for start in range(0, n, block):
+        rows = x[start:start + block]
+        d = rows @ x.T  # |a|^2 is constant along a row, so it can't change the ranking
+        d *= -2
+        d += sq
+        d[np.arange(len(rows)), np.arange(start, start + len(rows))] = np.inf
+        nearest = np.argpartition(d, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(d, nearest, axis=1).argsort(axis=1)
+        knn[start:start + block] = np.take_along_axis(nearest, order, axis=1)
+
+    knn = knn.tolist()
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    chain, current = [0], 0
+    # The fallback searches a compacted copy of the unvisited rows, rebuilt
+    # whenever more than half of it has been visited since.
+    remaining = np.arange(1, n)
+    rest, rest_sq = x[remaining], sq[remaining]
+    for left in range(n - 1, 0, -1):
+        step = next((c for c in knn[current] if not visited[c]), None)
+        if step is None:
+            if len(remaining) > 2 * left:
+                remaining = np.flatnonzero(~visited)
+                rest, rest_sq = x[remaining], sq[remaining]
+            d = rest_sq - 2 * (rest @ x[current])
+            d[visited[remaining]] = np.inf
+            step = int(remaining[d.argmin()])
+        visited[step] = True
+        chain.append(step)
+        current = step
+    return chain
+
+def encode_features(row):
+    import numpy as np
+    return base64.b64encode(row.astype(np.float16).tobytes()).decode("ascii")
+
+def decode_features(text):
+    import numpy as np
+    return np.frombuffer(base64.b64decode(text), dtype=np.float16).astype(np.float32)
+
+def write_rendition(src, dst, box, backend="pillow", quality=85):
+    # Worker process: decode src fitted to box and write it to dst as JPEG.
+    # The temp name is per process so a half-written file is never served.
+    img = decode_image(src, box, backend).image
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    tmp = f"{dst}.{os.getpid()}.tmp"
+    img.save(tmp, "JPEG", quality=quality)
+    os.replace(tmp, dst)
+
+def server_roots(config):
+    raw = config.get("Server", "roots", fallback="")
+    if not raw.strip():
+        raw = ",".join([config.get("Settings", "default_folder", fallback=os.getcwd()),
+                        config.get("Settings", "FavouriteFolders", fallback="")])
+    return list(dict.fromkeys(p.strip() for p in raw.split(",") if p.strip()))
+
+class _HTTPError(Exception):
+    def __init__(self, status, message=""):
+        super().__init__(message)
+        self.status = status
+
+class _HeadOnly:
+    # Stands in for the stream writer on HEAD requests: the status line and
+    # headers (always written in one piece) go through, the body is dropped
+    head_only = True
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.in_body = False
+
+    def write(self, data):
+        if self.in_body:
+            return
+        end = data.find(b"\r\n\r\n")
+        if end >= 0:
+            data, self.in_body = data[:end + 4], True
+        self.writer.write(data)
+
+    async def drain(self):
+        await self.writer.drain()
+
+_range_re = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+BROWSE_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width,initial-scale=1">
+<title>VtView</title>
+<style>
+body{margin:0;font:14px sans-serif;background:#1e1e1e;color:#e0e0e0}
+header,#bar{display:flex;flex-wrap:wrap;gap:6px;padding:6px;background:#2d2d2d}
+header{position:sticky;top:0}
+#folders{padding:4px}
+#grid{display:grid;grid-template-columns:repeat(auto-fill,minmax(160px,1fr));gap:4px;padding:4px}
+.cell{cursor:pointer;text-align:center;overflow:hidden}
+.cell img{width:100%;height:160px;object-fit:contain;background:#000}
+.cell div{font-size:11px;white-space:nowrap;overflow:hidden;text-overflow:ellipsis}
+#viewer{display:none;position:fixed;inset:0;background:#000;flex-direction:column}
+#media{flex:1;display:flex;min-height:0}
+#media img,#media video{flex:1;min-width:0;object-fit:contain}
+</style></head><body>
+<header><select id="root"></select><span id="crumbs"></span>
+<input id="q" placeholder="search, #tag, w>3000"><select id="sort"></select></header>
+<div id="folders"></div><div id="grid"></div>
+<div id="viewer"><div id="bar"><button id="prev">&lt;</button><button id="next">&gt;</button>
+<input id="tag" placeholder="#tag" size="10"><button id="add">Add</button><button id="remove">Remove</button>
+<button id="scrub">Scrub</button><button id="close">Close</button><span id="title"></span></div>
+<div id="media"></div></div>
+<script>
+const $ = id => document.getElementById(id);
+const qs = o => new URLSearchParams(o).toString();
+let state = {root: "", path: "", files: [], index: 0};
+async function api(url, body) {
+  const r = await fetch(url, body ? {method: "POST", headers: {"Content-Type": "application/json"},
+                                  body: JSON.stringify(body)} : {});
+  if (!r.ok) throw new Error(await r.text());
+  return r.json();
+}
+const ref = f => ({root: state.root, path: state.path, name: f.name});
+async function load() {
+  const data = await api("/api/list?" + qs({root: state.root, path: state.path, q: $("q").value, sort: $("sort").value}));
+  state.files = data.files;
+  $("crumbs").textContent = "/" + state.path;
+  $("folders").innerHTML = "";
+  for (const name of (state.path ? [".."] : []).concat(data.folders)) {
+    const b = document.createElement("button");
+    b.textContent = name;
+    b.onclick = () => {
+      state.path = name == ".." ? state.path.split("/").slice(0, -1).join("/") : (state.path ? state.path + "/" : "") + name;
+      load();
+    };
+    $("folders").append(b);
+  }
+  $("grid").innerHTML = "";
+  data.files.forEach((f, i) => {
+    const cell = document.createElement("div"), img = document.createElement("img"), label = document.createElement("div");
+    cell.className = "cell";
+    img.loading = "lazy";
+    if (!f.video) img.src = "/thumb?" + qs(ref(f));
+    label.textContent = f.name;
+    cell.append(img, label);
+    cell.onclick = () => show(i);
+    $("grid").append(cell);
+  });
+}
+function show(i) {
+  const f = state.files[i], el = document.createElement(f.video ? "video" : "img"), scale = devicePixelRatio || 1;
+  state.index = i;
+  $("title").textContent = f.name;
+  if (f.video) { el.controls = true; el.src = "/file?" + qs(ref(f)); }
+  else el.src = "/view?" + qs({...ref(f), w: Math.round(innerWidth * scale), h: Math.round(innerHeight * scale)});
+  $("media").replaceChildren(el);
+  $("viewer").style.display = "flex";
+}
+async function rename(url, body) {
+  const f = state.files[state.index];
+  try { f.name = (await api(url, {...ref(f), ...body})).name; show(state.index); }
+  catch (e) { alert(e.message); }
+}
+$("prev").onclick = () => state.index > 0 && show(state.index - 1);
+$("next").onclick = () => state.index < state.files.length - 1 && show(state.index + 1);
+$("close").onclick = () => { $("viewer").style.display = "none"; $("media").replaceChildren(); load(); };
+$("add").onclick = () => rename("/api/tag", {add: $("tag").value});
+$("remove").onclick = () => rename("/api/tag", {remove: $("tag").value});
+$("scrub").onclick = () => rename("/api/scrub", {});
+let timer;
+$("q").oninput = () => { clearTimeout(timer); timer = setTimeout(load, 300); };
+$("sort").onchange = load;
+$("root").onchange = () => { state.root = $("root").value; state.path = ""; load(); };
+api("/api/roots").then(d => {
+  for (const r of d.roots) $("root").add(new Option(r, r));
+  for (const s of d.sorts) $("sort").add(new Option(s, s));
+  state.root = d.roots[0] || "";
+  load();
+});
+</script></body></html>
+"""
+
+class BrowseServer:
+    # Optional HTTP/1.1 server on asyncio for browsing and tagging from
+    # another device. Only folders under the configured roots are served.
+    # Thumbnails and screen-sized renditions are made in a bounded process
+    # pool and cached on disk by path, mtime, size and box; concurrent
+    # requests for the same rendition wait on one decode. asyncio and the
+    # other server-only modules are imported here so the GUI doesn't pay
+    # for them at startup.
+    def __init__(self, roots, supported_formats, video_exts, cache_dir, host="127.0.0.1", port=8765,
+                 workers=2, thumb_size=256, max_view=2048, cache_mb=1024, on_rename=None):
+        self.roots = OrderedDict()
+        for path in roots:
+            path = os.path.abspath(path)
+            if not os.path.isdir(path):
+                continue
+            label = os.path.basename(os.path.normpath(path)) or path
+            while label in self.roots:
+                label += "_"
+            self.roots[label] = path
+        self.supported_formats = supported_formats
+        self.video_exts = video_exts
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.thumb_size = thumb_size
+        self.max_view = max_view
+        self.on_rename = on_rename
+        self.render_dir = os.path.join(cache_dir, "web")
+        self.cache_limit = cache_mb * 1024 * 1024
+        self.cache_used = 0
+        self.pruning = None
+        self.metadata_cache = FileCache(os.path.join(cache_dir, "cache.db"), "media_meta")
+        try:
+            with open(os.path.join(cache_dir, "decoders.json"), encoding="utf-8") as f:
+                self.decoders = json.load(f).get("choice", {})
+        except (OSError, ValueError):
+            self.decoders = {}
+        self.renders = {}  # rendition path -> future while it is being made
+        self.failed = {}  # (path, mtime) -> error, so a broken file isn't decoded on every request
+        self.loop = None
+        self.server = None
+        self.pool = None
+
+    def start(self):
+        # Alongside the GUI: the event loop gets its own thread
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        import asyncio
+        try:
+            asyncio.run(self.serve())
+        except asyncio.CancelledError:
+            pass
+
+    async def serve(self):
+        import asyncio
+        from concurrent.futures import ProcessPoolExecutor
+        os.makedirs(self.render_dir, exist_ok=True)
+        self.loop = asyncio.get_running_loop()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.slots = asyncio.Semaphore(self.workers * 4)  # bounds the decode queue, not just the workers
+        self.cache_used = await self.loop.run_in_executor(None, self.prune_renditions)
+        try:
+            self.server = await asyncio.start_server(self.handle, self.host, self.port)
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.loop and self.server:
+            self.loop.call_soon_threadsafe(self.server.close)
+
+    async def handle(self, reader, writer):
+        import asyncio
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                method, target, version = line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > 65536:
+                    raise ValueError("request body too large")
+                body = await reader.readexactly(length) if length else b""
+                out = _HeadOnly(writer) if method == "HEAD" else writer
+                try:
+                    self.check_request(writer, method, headers)
+                    await self.respond(out, "GET" if method == "HEAD" else method, target, headers, body)
+                except _HTTPError as e:
+                    await self.send(out, e.status, str(e).encode("utf-8"), "text/plain; charset=utf-8")
+                except (ConnectionError, asyncio.CancelledError):
+                    raise
+                except Exception as e:
+                    await self.send(out, 500, str(e).encode("utf-8"), "text/plain; charset=utf-8")
+                if version != "HTTP/1.1" or headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def check_request(self, writer, method, headers):
+        # No login, so at least make sure the request is meant for us and
+        # comes from our own page: the Host must be the address we're bound
+        # to (a rebinding DNS name won't be), a browser Origin must match it,
+        # and POSTs must be JSON, which a cross-site form can't send.
+        sockname = writer.get_extra_info("sockname") or (self.host, self.port)
+        allowed = set()
+        for addr in {self.host, sockname[0]}:
+            if ":" in addr:
+                addr = f"[{addr}]"
+            allowed.add(f"{addr}:{sockname[1]}".lower())
+            if addr in ("127.0.0.1", "[::1]"):
+                allowed.add(f"localhost:{sockname[1]}")
+        host = headers.get("host", "").lower()
+        if host not in allowed:
+            raise _HTTPError(421, "wrong host")
+        origin = headers.get("origin")
+        if origin is not None and origin.lower() != f"http://{host}":
+            raise _HTTPError(403, "cross-origin request refused")
+        if method not in ("GET", "HEAD", "POST"):
+            raise _HTTPError(405, "method not allowed")
+        if method == "POST" and headers.get("content-type", "").split(";")[0].strip().lower() != "application/json":
+            raise _HTTPError(415, "expected application/json")
+
+    async def send(self, writer, status, body=b"", content_type="application/octet-stream", headers=()):
+        from http import HTTPStatus
+        head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                f"Content-Type: {content_type}", f"Content-Length: {len(body)}", *headers]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def send_json(self, writer, data):
+        await self.send(writer, 200, json.dumps(data).encode("utf-8"), "application/json")
+
+    async def respond(self, writer, method, target, headers, body):
+        from urllib.parse import urlsplit, parse_qs
+        url = urlsplit(target)
+        params = {key: values[-1] for key, values in parse_qs(url.query, keep_blank_values=True).items()}
+        route = (method, url.path)
+        if route == ("GET", "/"):
+            await self.send(writer, 200, BROWSE_PAGE.encode("utf-8"), "text/html; charset=utf-8")
+        elif route == ("GET", "/api/roots"):
+            await self.send_json(writer, {"roots": list(self.roots),
+                                          "sorts": [m for m in SORT_METHODS if m != "Similarity"]})
+        elif route == ("GET", "/api/list"):
+            await self.send_json(writer, await self.list_folder(params))
+        elif route == ("GET", "/thumb"):
+            await self.send_rendition(writer, params, headers, "thumbs", (self.thumb_size, self.thumb_size))
+        elif route == ("GET", "/view"):
+            await self.send_view(writer, params, headers)
+        elif route == ("GET", "/file"):
+            folder, name = self.resolve(params)
+            await self.send_file(writer, os.path.join(folder, name), headers)
+        elif route == ("POST", "/api/tag"):
+            await self.send_json(writer, await self.rename(body, "tag"))
+        elif route == ("POST", "/api/scrub"):
+            await self.send_json(writer, await self.rename(body, "scrub"))
+        else:
+            raise _HTTPError(404, "not found")
+
+    def resolve(self, params, with_name=True):
+        # Map root label + relative path (+ file name) to a folder on disk,
+        # refusing anything that would step outside the root
+        root = self.roots.get(params.get("root", ""))
+        if root is None:
+            raise _HTTPError(404, "unknown root")
+        folder = os.path.normpath(os.path.join(root, params.get("path", "")))
+        try:
+            inside = os.path.commonpath([root, folder]) == root
+        except ValueError:
+            inside = False
+        if not inside:
+            raise _HTTPError(403, "outside the served folders")
+        if not with_name:
+            return folder, None
+        name = params.get("name", "")
+        if not name or os.path.basename(name) != name or name in (".", ".."):
+            raise _HTTPError(400, "bad file name")
+        if not name.lower().endswith(self.supported_formats):
+            raise _HTTPError(403, "not a media file")
+        return folder, name
+
+    def scan(self, folder, need_meta):
+        # Runs on the default executor: listing, subfolders and cached
+        # metadata. Missing metadata is probed only when a filter or sort
+        # needs it, and stored for the GUI as well.
+        records = scan_folder(folder, self.supported_formats, self.video_exts)
+        with os.scandir(folder) as it:
+            folders = sorted((e.name for e in it if e.is_dir() and not e.name.startswith(".")), key=natural_key)
+        try:
+            cached = self.metadata_cache.load_folder(folder)
+        except Exception:
+            cached = {}
+        metadata, rows = {}, []
+        for record in records:
+            row = cached.get(record.name)
+            if row and row[0] == record.mtime and row[1] == record.size:
+                metadata[record.name] = decode_meta(row[2])
+            elif need_meta:
+                probe = probe_video if record.media == MEDIA_VIDEO else probe_image
+                try:
+                    meta = probe(os.path.join(folder, record.name))
+                except Exception:
+                    meta = None
+                metadata[record.name] = meta
+                rows.append((record.name, record.mtime, record.size, encode_meta(meta)))
+        if rows:
+            try:
+                self.metadata_cache.store(folder, rows)
+            except Exception:
+                pass
+        return records, folders, metadata
+
+    async def list_folder(self, params):
+        folder, _ = self.resolve(params, with_name=False)
+        if not os.path.isdir(folder):
+            raise _HTTPError(404, "no such folder")
+        terms, filters = parse_query(params.get("q", ""))
+        sort = params.get("sort", "Name")
+        records, folders, metadata = await self.loop.run_in_executor(
+            None, self.scan, folder, bool(filters) or sort in META_SORT_KEYS)
+
+        records = [r for r in records if all(t in r.lower for t in terms)
+                   and all(f(metadata.get(r.name)) for f in filters)]
+        if sort in META_SORT_KEYS:
+            meta_key = META_SORT_KEYS[sort]
+
+            def sort_key(record):
+                meta = metadata.get(record.name)
+                return (0, meta_key(meta), record.lower) if meta else (1, 0, record.lower)
+        else:
+            sort_key = SORT_KEYS.get(sort, SORT_KEYS["Name"])
+        records.sort(key=sort_key, reverse=params.get("desc") == "1")
+        try:
+            offset = int(params.get("offset") or 0)
+            limit = int(params.get("limit") or len(records))
+        except ValueError:
+            raise _HTTPError(400, "bad offset or limit")
+        if offset < 0 or limit < 0:
+            raise _HTTPError(400, "bad offset or limit")
+        files = []
+        for record in records[offset:offset + limit]:
+            meta = metadata.get(record.name)
+            files.append({
+                "name": record.name, "size": record.size, "mtime": record.mtime,
+                "video": record.media == MEDIA_VIDEO, "tags": record.tag_string,
+                "meta": meta._asdict() if meta else None,
+            })
+        return {"folders": folders, "files": files, "total": len(records)}
+
+    async def send_view(self, writer, params, headers):
+        # Screen-sized rendition, with the box rounded up to 256 px steps so
+        # nearby screen sizes share cache entries. Animations are sent as the
+        # original file so the browser can play them.
+        folder, name = self.resolve(params)
+        path = os.path.join(folder, name)
+        if name.lower().endswith(self.video_exts):
+            return await self.send_file(writer, path, headers)
+        if name.lower().endswith((".gif", ".webp", ".png")):
+            try:
+                meta = await self.loop.run_in_executor(None, probe_image, path)
+            except Exception:
+                meta = None
+            if meta and meta.frames > 1:
+                return await self.send_file(writer, path, headers)
+        try:
+            box = [int(params.get(key) or self.max_view) for key in ("w", "h")]
+        except ValueError:
+            raise _HTTPError(400, "bad size")
+        box = tuple(min(self.max_view, max(256, -(-v // 256) * 256)) for v in box)
+        await self.send_rendition(writer, params, headers, "views", box)
+
+    async def send_rendition(self, writer, params, headers, kind, box):
+        import asyncio
+        import hashlib
+        folder, name = self.resolve(params)
+        path = os.path.join(folder, name)
+        if name.lower().endswith(self.video_exts):
+            raise _HTTPError(404, "no thumbnails for videos")
+        try:
+            stat = os.stat(path)
+        except OSError:
+            raise _HTTPError(404, "no such file")
+        key = hashlib.sha1(f"{path}|{stat.st_mtime}|{stat.st_size}|{box[0]}x{box[1]}".encode("utf-8")).hexdigest()
+        etag = f'"{key}"'
+        if headers.get("if-none-match") == etag:
+            return await self.send(writer, 304)
+        dst = os.path.join(self.render_dir, kind, key[:2], key + ".jpg")
+        try:
+            os.utime(dst)  # mtime is the last use, for pruning
+        except OSError:
+            error = self.failed.get((path, stat.st_mtime))
+            if error is not None:
+                raise _HTTPError(500, error)
+            future = self.renders.get(dst)
+            if future is None:
+                future = self.renders[dst] = asyncio.ensure_future(self.render(path, stat.st_mtime, dst, box))
+                future.add_done_callback(lambda f: self.renders.pop(dst, None))
+            # Shielded so one client hanging up doesn't cancel the others' wait
+            await asyncio.shield(future)
+        await self.send_file(writer, dst, headers, "image/jpeg", [f"ETag: {etag}", "Cache-Control: no-cache"])
+
+    async def render(self, path, mtime, dst, box):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        ext = os.path.splitext(path)[1].lower()
+        backend = self.decoders.get(".jpg" if ext in JPEG_EXTS else ext, "pillow")
+        async with self.slots:
+            try:
+                await self.loop.run_in_executor(self.pool, write_rendition, path, dst, box, backend)
+            except Exception as e:
+                # Remembered until the file changes; a new mtime is a new key
+                self.failed[(path, mtime)] = f"cannot decode {os.path.basename(path)}: {e}"
+                raise _HTTPError(500, self.failed[(path, mtime)])
+        self.cache_used += os.path.getsize(dst)
+        if self.cache_used > self.cache_limit and self.pruning is None:
+            self.pruning = self.loop.run_in_executor(None, self.prune_renditions)
+            self.pruning.add_done_callback(self.pruned)
+
+    def prune_renditions(self):
+        # Runs on the default executor: delete the least recently used
+        # renditions (by mtime, which cache hits refresh) until the cache
+        # is back under 90% of its limit. Returns the bytes left.
+        entries = []
+        for dirpath, _, files in os.walk(self.render_dir):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        used = sum(size for _, size, _ in entries)
+        if used <= self.cache_limit:
+            return used
+        entries.sort()
+        for _, size, path in entries:
+            if used <= self.cache_limit * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue  # being written or sent; try the next one
+            used -= size
+        return used
+
+    def pruned(self, future):
+        self.pruning = None
+        if not future.cancelled() and future.exception() is None:
+            self.cache_used = future.result()
+
+    async def send_file(self, writer, path, headers, content_type=None, extra=()):
+        # Whole file or a single byte range (what video elements ask for),
+        # streamed in chunks read off the event loop thread. The file is
+        # opened first so a rendition pruned meanwhile can't vanish mid-reply.
+        import mimetypes
+        try:
+            f = open(path, "rb")
+        except OSError:
+            raise _HTTPError(404, "no such file")
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            content_type = content_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+            start, end, status = 0, size - 1, 200
+            extra = ["Accept-Ranges: bytes", *extra]
+            match = _range_re.match(headers.get("range", ""))
+            if match and (match.group(1) or match.group(2)):
+                if match.group(1):
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                else:
+                    start = max(0, size - int(match.group(2)))
+                if start >= size or start > end:
+                    return await self.send(writer, 416, headers=[f"Content-Range: bytes */{size}"])
+                status = 206
+                extra.append(f"Content-Range: bytes {start}-{end}/{size}")
+            from http import HTTPStatus
+            head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", f"Content-Type: {content_type}",
+                    f"Content-Length: {end - start + 1}", *extra]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+            if getattr(writer, "head_only", False):
+                return await writer.drain()
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await self.loop.run_in_executor(None, f.read, min(remaining, 262144))
+                if not chunk:
+                    break
+                writer.write(chunk)
+                remaining -= len(chunk)
+                await writer.drain()
+
+    async def rename(self, body, action):
+        # Tag edits use the same filename rules as the GUI: adding goes
+        # through scrub_filename, removing through retag_filename
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise _HTTPError(400, "bad JSON")
+        if not isinstance(data, dict) or not all(isinstance(v, str) for v in data.values()):
+            raise _HTTPError(400, "expected an object of strings")
+        folder, name = self.resolve(data)
+        if action == "scrub":
+            new_name = scrub_filename(name)
+        else:
+            tag = normalize_tag(data.get("add") or data.get("remove") or "")
+            if not _hashtag_re.fullmatch(tag):
+                raise _HTTPError(400, "bad tag")
+            if data.get("add"):
+                base, ext = os.path.splitext(name)
+                new_name = scrub_filename(f"{base} {tag}{ext}")
+            else:
+                new_name = retag_filename(name, tag, "")
+                if new_name == name:
+                    raise _HTTPError(409, f"{name} is not tagged {tag}")
+        if new_name != name:
+            await self.loop.run_in_executor(None, self.move, folder, name, new_name)
+            if self.on_rename:
+                self.on_rename(folder, name, new_name)
+        return {"name": new_name}
+
+    @staticmethod
+    def move(folder, name, new_name):
+        # Runs on the default executor so a slow disk doesn't stall the loop
+        src, dst = os.path.join(folder, name), os.path.join(folder, new_name)
+        if not os.path.exists(src):
+            raise _HTTPError(404, "no such file")
+        if os.path.exists(dst) and os.path.normcase(src) != os.path.normcase(dst):
+            raise _HTTPError(409, f"{new_name} already exists")
+        os.rename(src, dst)
 
 class ImageBrowserApp:
     def change_to_favorite_folder(self, event=None):
@@ -39,31 +2242,103 @@ class ImageBrowserApp:
 
     def toggle_sort_direction(self):
         self.sort_ascending = not self.sort_ascending
-        self.load_images()
+        self.reverse_sort()
 
     def set_sort_ascending(self):
-        self.sort_ascending = True
-        self.load_images()
+        if not self.sort_ascending:
+            self.sort_ascending = True
+            self.reverse_sort()
 
     def set_sort_descending(self):
-        self.sort_ascending = False
-        self.load_images()
-        
-    def sort_key_factory(self, method):
-        def sort_key(filename):
-            path = os.path.join(self.current_folder, filename)
-            try:
-                if method == "Size":
-                    return os.path.getsize(path)
-                elif method == "Created":
-                    return os.path.getctime(path)
-                elif method == "Modified":
-                    return os.path.getmtime(path)
+        if self.sort_ascending:
+            self.sort_ascending = False
+            self.reverse_sort()
+
+    def reverse_sort(self):
+        # Direction change only flips the already sorted view
+        self.records.reverse()
+        self.last_query = None
+        self.all_files.reverse()
+        self.update_file_list()
+
+    def set_records(self, records):
+        self.records = records
+        self.records_by_name = {r.name: r for r in records}
+        self.facets.rebuild(records)
+        if self.current_folder != self.records_folder:
+            self.records_folder = self.current_folder
+            self.facet_filter.clear()
+
+    def update_records(self, removed=(), added=(), renamed=()):
+        # Apply VtView's own file operations to the loaded folder without
+        # relisting it. Renames keep their stat fields and metadata; only
+        # added files are stat'ed.
+        drop = set(removed)
+        new_records = []
+        renamed_to = set()
+        for old_name, new_name in renamed:
+            old = self.records_by_name.get(old_name)
+            drop.add(old_name)
+            if old is None or not new_name.lower().endswith(self.supported_formats):
+                continue
+            # A rename onto an existing name replaces that file, so its record
+            # and anything cached under the name go too
+            drop.add(new_name)
+            renamed_to.add(new_name)
+            record = FileRecord(new_name, None, self.video_extensions)
+            record.size, record.ctime, record.mtime = old.size, old.ctime, old.mtime
+            new_records.append(record)
+            for table in (self.metadata, self.broken, self.similarity_rank):
+                if old_name in table:
+                    table[new_name] = table.pop(old_name)
                 else:
-                    return filename.lower()
-            except:
-                return 0
-        return sort_key
+                    table.pop(new_name, None)
+        for name in added:
+            if not name.lower().endswith(self.supported_formats):
+                continue
+            drop.add(name)
+            try:
+                stat = os.stat(os.path.join(self.current_folder, name))
+            except OSError:
+                continue
+            new_records.append(FileRecord(name, stat, self.video_extensions))
+
+        drop = {name for name in drop if name in self.records_by_name}
+        for name in drop:
+            self.facets.remove(self.records_by_name.pop(name))
+            if name not in renamed_to:
+                self.broken.pop(name, None)
+        for record in new_records:
+            self.records_by_name[record.name] = record
+            self.facets.add(record)
+        if drop:
+            self.records = [r for r in self.records if r.name not in drop]
+        self.records.extend(new_records)
+        self.apply_sort()
+        if added:
+            self.start_metadata_probe()
+            self.start_integrity_scan()
+
+    def apply_sort(self):
+        sort_method = self.sort_var.get() if hasattr(self, 'sort_var') else "Name"
+        sort_key = SORT_KEYS.get(sort_method, SORT_KEYS["Name"])
+        if sort_method in META_SORT_KEYS:
+            meta_key, metadata = META_SORT_KEYS[sort_method], self.metadata
+
+            def sort_key(record):
+                meta = metadata.get(record.name)
+                return (0, meta_key(meta), record.lower) if meta else (1, 0, record.lower)
+        elif sort_method == "Similarity":
+            self.ensure_similarity_order()
+            ranks = self.similarity_rank
+
+            def sort_key(record):
+                rank = ranks.get(record.name)
+                return (rank is None, rank or 0, record.lower)
+        self.records.sort(key=sort_key, reverse=not getattr(self, 'sort_ascending', True))
+        self.all_files = [record.name for record in self.records]
+        self.last_query = None
+        self.update_file_list()
 
     def on_listbox_motion(self, event):
         index = self.listbox.nearest(event.y)
@@ -204,6 +2479,7 @@ class ImageBrowserApp:
         return var.get().strip()
 
     def open_help_url(self, event=None):
+        import webbrowser
         webbrowser.open("https://github.com/david-chase/vtview/blob/main/README.md")    
     
     def show_status_dialog(self, title, filenames):
@@ -228,38 +2504,29 @@ class ImageBrowserApp:
         if not selection:
             return
 
-        for i in selection:
-            filename = self.listbox.get(i)
-            base, ext = os.path.splitext(filename)
+        created = []
+        for filename in self.selected_filenames():
+            record = self.records_by_name.get(filename)
 
-            # Check if "-" exists
-            if "-" not in base:
+            # Needs "model-..." with no whitespace in the model name
+            if not record or not record.is_indexable:
                 continue
 
-            model_part, rest = base.split("-", 1)
-            if " " in model_part:
-                continue  # model name must not contain whitespace
-
-            # Extract tags (starting from first "#")
-            tag_match = re.search(r"(#.+)", base)
-            tags = tag_match.group(1).strip() if tag_match else ""
-
-            # Extract root name (everything after "-" and before tags)
-            root_match = re.split(r"\s+#", rest, maxsplit=1)
-            root_name = root_match[0].strip()
-
             # Construct new index filename
-            new_filename = f"{model_part}-index {tags}{ext}"
+            ext = os.path.splitext(filename)[1]
+            new_filename = f"{record.model}-index {record.tag_string}{ext}"
             src_path = os.path.join(self.current_folder, filename)
             dst_path = os.path.join(self.current_folder, new_filename)
 
             if not os.path.exists(dst_path):
                 try:
                     shutil.copy2(src_path, dst_path)
+                    created.append(new_filename)
                 except Exception as e:
                     messagebox.showerror("Index Copy Failed", f"Failed to create index file for {filename}:\n{e}")
-            
-            self.load_images()
+
+        if created:
+            self.update_records(added=created)
 
     def remove_custom_tag(self, event=None):
         selection = self.listbox.curselection()
@@ -270,21 +2537,19 @@ class ImageBrowserApp:
         if not tag:
             return
 
-        tag = tag.strip()
-        if not tag.startswith("#"):
-            tag = f"#{tag}"
+        tag = normalize_tag(tag)
 
-        filenames = [self.listbox.get(i) for i in selection]
+        filenames = self.selected_filenames()
         updated_filenames = []
+        renamed = []
         dialog, label, progress = self.show_status_dialog("Removing Tag", filenames)
 
         for i, filename in enumerate(filenames):
             label.config(text=filename)
             dialog.update_idletasks()
 
-            base, ext = os.path.splitext(filename)
-            modified = re.sub(re.escape(tag), "", base, flags=re.IGNORECASE)
-            new_filename = scrub_filename(f"{modified}{ext}")
+            # Whole tags only: dropping #blond leaves #blonde alone
+            new_filename = retag_filename(filename, tag, "")
 
             if new_filename == filename:
                 continue
@@ -295,6 +2560,7 @@ class ImageBrowserApp:
             try:
                 os.rename(src, dst)
                 updated_filenames.append(new_filename)
+                renamed.append((filename, new_filename))
             except Exception as e:
                 messagebox.showerror("Rename Failed", f"Could not remove tag from {filename}:\n{e}")
 
@@ -303,19 +2569,9 @@ class ImageBrowserApp:
         dialog.destroy()
 
         if updated_filenames:
-            self.load_images()
-            filenames = self.listbox.get(0, tk.END)
-            self.listbox.selection_clear(0, tk.END)
-            for fname in updated_filenames:
-                try:
-                    idx = filenames.index(fname)
-                    self.listbox.selection_set(idx)
-                    self.listbox.activate(idx)
-                    self.listbox.see(idx)
-                except ValueError:
-                    continue
+            self.update_records(renamed=renamed)
+            self.select_filenames(updated_filenames)
             self.listbox.focus_set()
-            self.listbox.event_generate("<<ListboxSelect>>")
 
 
     def add_custom_tag(self, event=None):
@@ -331,8 +2587,9 @@ class ImageBrowserApp:
         if not tag.startswith("#"):
             tag = f"#{tag}"
 
-        filenames = [self.listbox.get(i) for i in selection]
+        filenames = self.selected_filenames()
         updated_filenames = []
+        renamed = []
         dialog, label, progress = self.show_status_dialog("Adding Tag", filenames)
 
         for i, filename in enumerate(filenames):
@@ -350,6 +2607,7 @@ class ImageBrowserApp:
             try:
                 os.rename(src, dst)
                 updated_filenames.append(new_filename)
+                renamed.append((filename, new_filename))
             except Exception as e:
                 messagebox.showerror("Rename Failed", f"Could not add tag to {filename}:\n{e}")
 
@@ -358,30 +2616,222 @@ class ImageBrowserApp:
         dialog.destroy()
 
         if updated_filenames:
-            self.load_images()
-            filenames = self.listbox.get(0, tk.END)
-            self.listbox.selection_clear(0, tk.END)
-            for fname in updated_filenames:
-                try:
-                    idx = filenames.index(fname)
-                    self.listbox.selection_set(idx)
-                    self.listbox.activate(idx)
-                    self.listbox.see(idx)
-                except ValueError:
-                    continue
+            self.update_records(renamed=renamed)
+            self.select_filenames(updated_filenames)
             self.listbox.focus_set()
-            self.listbox.event_generate("<<ListboxSelect>>")
+
+    def get_tag_roots(self):
+        raw = self.config.get("Settings", "TagRoots", fallback="")
+        roots = [r.strip() for r in raw.split(",") if r.strip()]
+        if not roots:
+            roots = [self.default_folder] + [
+                self.config.get("Settings", key, fallback="")
+                for key in ("ModelBaseDir", "VideoBaseDir", "VideoAllDir")
+            ]
+        return [r for r in roots if r and os.path.isdir(r)]
+
+    def refactor_tag(self, event=None):
+        old_tag = simpledialog.askstring("Rename Tag", "Tag to rename or drop across the library (e.g. #blackhair):")
+        if not old_tag or not old_tag.strip():
+            return
+        new_tag = simpledialog.askstring("Rename Tag", f"Replace {old_tag.strip()} with (leave blank to drop it):")
+        if new_tag is None:
+            return
+
+        old_tag, new_tag = normalize_tag(old_tag), normalize_tag(new_tag)
+        bad = [tag for tag in (old_tag, new_tag) if tag and not _hashtag_re.fullmatch(tag)]
+        if bad:
+            messagebox.showerror("Rename Tag", f"{bad[0]} is not a tag; use one word of letters, digits or _.")
+            return
+        if old_tag == new_tag:
+            return
+        roots = self.get_tag_roots()
+
+        dialog, label, progress = self.show_status_dialog("Planning Tag Rename", [])
+        progress.config(mode="indeterminate")
+
+        def on_progress(scanned, planned):
+            label.config(text=f"{scanned} folders scanned, {planned} files to rename")
+            progress.step()
+            dialog.update()
+
+        try:
+            plan, conflicts = plan_tag_rename(roots, old_tag, new_tag, self.supported_formats, progress=on_progress)
+        finally:
+            dialog.destroy()
+
+        if not plan and not conflicts:
+            messagebox.showinfo("Rename Tag", f"No files tagged {old_tag} under:\n" + "\n".join(roots))
+            return
+        title = f"{old_tag} → {new_tag}" if new_tag else f"Drop {old_tag}"
+        if not self.confirm_tag_plan(title, plan, conflicts) or not plan:
+            return
+
+        journal_path = os.path.join(self.cache_dir, f"tag-journal-{time.strftime('%Y%m%d-%H%M%S')}.tsv")
+        dialog, label, progress = self.show_status_dialog("Renaming Tags", plan)
+
+        def on_applied(count):
+            label.config(text=f"{count} of {len(plan)} files renamed")
+            progress["value"] = count
+            dialog.update_idletasks()
+
+        try:
+            failures = apply_tag_plan(plan, journal_path, progress=on_applied)
+        finally:
+            dialog.destroy()
+        if failures:
+            messagebox.showerror(
+                "Rename Tag",
+                f"{len(failures)} files could not be renamed. See the journal:\n{journal_path}"
+            )
+        self.load_images()
+
+    def confirm_tag_plan(self, title, plan, conflicts, max_lines=5000):
+        top = tk.Toplevel(self.root)
+        top.title(f"Dry Run - {title}")
+        top.geometry("900x600")
+        top.grab_set()
+        top.configure(bg=self.colors["background"])
+
+        tk.Label(
+            top,
+            text=f"{len(plan)} files will be renamed, {len(conflicts)} skipped because of name collisions.",
+            bg=self.colors["background"], fg=self.colors["foreground"], anchor="w"
+        ).pack(fill=tk.X, padx=10, pady=(10, 5))
+
+        text_frame = tk.Frame(top, bg=self.colors["background"])
+        text_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        scrollbar = ttk.Scrollbar(text_frame, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        text = tk.Text(
+            text_frame, wrap="none", yscrollcommand=scrollbar.set,
+            bg=self.colors["entry_background"], fg=self.colors["entry_foreground"]
+        )
+        text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.config(command=text.yview)
+
+        # At most max_lines entries, conflicts first; folder headers don't count
+        lines = [f"! {os.path.join(folder, src)}\n  -> {dst}  ({reason})\n"
+                 for folder, src, dst, reason in conflicts[:max_lines]]
+        shown = len(lines)
+        last_folder = None
+        for folder, src, dst in plan[:max_lines - shown]:
+            if folder != last_folder:
+                lines.append(f"\n[{folder}]\n")
+                last_folder = folder
+            lines.append(f"- {src}\n+ {dst}\n")
+            shown += 1
+        if shown < len(plan) + len(conflicts):
+            lines.append(f"\n... {len(plan) + len(conflicts) - shown} more\n")
+        text.insert("1.0", "".join(lines))
+        text.config(state="disabled")
+
+        result = tk.BooleanVar(value=False)
+
+        def on_apply():
+            result.set(True)
+            top.destroy()
+
+        button_frame = tk.Frame(top, bg=self.colors["background"])
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        for caption, command in (("Cancel", top.destroy), ("Apply", on_apply)):
+            tk.Button(
+                button_frame, text=caption, width=12, command=command,
+                bg=self.colors["button_background"], fg=self.colors["button_foreground"],
+                activebackground=self.colors["highlight"]
+            ).pack(side=tk.RIGHT, padx=(5, 0))
+        top.bind("<Escape>", lambda e: top.destroy())
+
+        top.wait_window()
+        return result.get()
+
+    def export_contact_sheets(self, event=None):
+        # Selected files if more than one is selected, otherwise everything listed
+        filenames = self.selected_filenames()
+        if len(filenames) < 2:
+            filenames = self.listed_filenames()
+        filenames = [f for f in filenames if not f.lower().endswith(self.video_extensions)]
+        if not filenames:
+            return
+        out_dir = filedialog.askdirectory(title="Select Folder for Contact Sheets", initialdir=self.current_folder)
+        if not out_dir:
+            return
+
+        prefix = os.path.basename(os.path.normpath(self.current_folder)) or "contact"
+        paths = [os.path.join(self.current_folder, f) for f in filenames]
+        dialog, label, progress = self.show_status_dialog("Building Contact Sheets", paths)
+        options = {key: self.config.getint("ContactSheet", option, fallback=default)
+                   for key, option, default in (("columns", "columns", 8), ("rows", "rows", 8),
+                                                ("cell", "cell_size", 256))}
+
+        def on_progress(done):
+            if dialog.winfo_exists():
+                label.config(text=f"{done} of {len(paths)} images")
+                progress["value"] = done
+
+        def on_done(written, error):
+            if dialog.winfo_exists():
+                dialog.destroy()
+            if error is not None:
+                messagebox.showerror("Contact Sheet Failed", f"Could not build contact sheets:\n{error}")
+            else:
+                messagebox.showinfo("Contact Sheets", f"Wrote {len(written)} contact sheet(s) to:\n{out_dir}")
+
+        def worker():
+            # Off the Tk thread; progress and the result come back through ui_queue
+            try:
+                written = build_contact_sheets(
+                    paths, out_dir, prefix, **options,
+                    progress=lambda done: self.ui_queue.put((on_progress, (done,)))
+                )
+            except Exception as e:
+                self.ui_queue.put((on_done, (None, e)))
+            else:
+                self.ui_queue.put((on_done, (written, None)))
+
+        threading.Thread(target=worker, daemon=True).start()
 
     def _tag_shortcut_handler(self, tag_value, event=None):
         self.tag_file_with_priority(str(tag_value))
 
-    def __init__(self, root):
+    def __init__(self, root, benchmark=False):
         self.root = root
+        self.benchmark = benchmark
+        self.startup_marks = {}
+        self.ui_queue = queue.Queue()
+        self.metadata = {}
+        self.metadata_folder = None
+        self.probe_generation = 0
+        self.broken = {}
+        self.integrity_folder = None
+        self.integrity_generation = 0
+        self.integrity_pool = None  # one pool for every scan, made on first use
+        self.integrity_lock = threading.Lock()
+        self.similarity_rank = {}
+        self.similarity_folder = None
+        self.similarity_generation = 0
+        self.similarity_running = False
+        self.similarity_pool = None  # shared by every pass, made on first use
+        self.similarity_lock = threading.Lock()
+        self.decoder_choice = {}
+        self.decoder_benchmark_running = False
+        self.decoded_image = (None, None)
+        self.pending_decode = None
+        self.tile_view = None
+        self.drag_origin = None
+        self.animation = None
+        self.fullscreen_animation = None
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
         self.config_path = os.path.join(self.script_dir, "vtview.ini")
         self.config = self.load_config()
+        set_max_image_pixels(self.config)
 
         self.colors = self.get_colors()
+        self.cache_dir = get_cache_dir(self.config)
+        self.metadata_cache = FileCache(os.path.join(self.cache_dir, "cache.db"), "media_meta")
+        self.integrity_cache = FileCache(os.path.join(self.cache_dir, "cache.db"), "integrity")
+        self.features_cache = FileCache(os.path.join(self.cache_dir, "cache.db"), "features")
+        self.decoder_setting = self.config.get("Settings", "decoder", fallback="auto").strip().lower()
 
         self.supported_formats = self.get_supported_extensions()
         self.shortcut_keys = self.get_shortcuts()
@@ -439,7 +2889,7 @@ class ImageBrowserApp:
         self.sort_dropdown = ttk.Combobox(
             folder_sort_frame,
             textvariable=self.sort_var,
-            values=["Name", "Size", "Created", "Modified"],
+            values=SORT_METHODS,
             state="readonly",
             width=10
         )
@@ -455,6 +2905,21 @@ class ImageBrowserApp:
         )
         self.sort_toggle_button.pack(side=tk.LEFT, padx=2)
 
+        self.group_var = tk.BooleanVar(value=self.config.getboolean("Settings", "group_by_model", fallback=False))
+        self.expanded_groups = set()
+        self.row_names = []
+        self.row_groups = []
+        tk.Checkbutton(
+            folder_sort_frame,
+            text="Group",
+            variable=self.group_var,
+            command=self.on_group_toggle,
+            bg=self.colors["background"],
+            fg=self.colors["foreground"],
+            activebackground=self.colors["background"],
+            selectcolor=self.colors["entry_background"]
+        ).pack(side=tk.LEFT, padx=(6, 0))
+
         tk.Label(
             folder_sort_frame,
             text="Favourites:",
@@ -474,7 +2939,7 @@ class ImageBrowserApp:
         self.fav_folder_dropdown.pack(side=tk.LEFT, padx=(10, 0))
         self.fav_folder_dropdown.bind("<<ComboboxSelected>>", self.change_to_favorite_folder)
 
-        self.sort_dropdown.bind("<<ComboboxSelected>>", lambda e: self.load_images())
+        self.sort_dropdown.bind("<<ComboboxSelected>>", lambda e: self.apply_sort())
 
         listbox_frame = tk.Frame(self.left_frame, bg=self.colors["foreground"], bd=1, relief="solid")
         listbox_frame.pack(fill=tk.BOTH, expand=True, padx=(0,0), pady=(10,5))
@@ -496,6 +2961,9 @@ class ImageBrowserApp:
         scrollbar.config(command=self.listbox.yview)
 
         self.listbox.bind("<<ListboxSelect>>", self.show_selected_image)
+        self.listbox.bind("<Double-Button-1>", self.on_listbox_double_click)
+        self.listbox.bind("<Right>", lambda e: self.on_listbox_expand(e, True))
+        self.listbox.bind("<Left>", lambda e: self.on_listbox_expand(e, False))
 
         self.tooltip_window = None
         self.tooltip_after_id = None
@@ -504,6 +2972,32 @@ class ImageBrowserApp:
         self.listbox.bind("<Motion>", self.on_listbox_motion)
         self.listbox.bind("<Leave>", self.hide_tooltip)
 
+        self.facet_frame = tk.Frame(self.paned, width=200, bg=self.colors["background"])
+        self.facet_frame.pack_propagate(False)
+        if self.config.getboolean("Settings", "show_tag_panel", fallback=True):
+            self.paned.add(self.facet_frame, minsize=120)
+
+        facet_list_frame = tk.Frame(self.facet_frame, bg=self.colors["foreground"], bd=1, relief="solid")
+        facet_list_frame.pack(fill=tk.BOTH, expand=True, pady=(10, 5))
+
+        facet_scrollbar = ttk.Scrollbar(facet_list_frame, orient=tk.VERTICAL)
+        facet_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.facet_listbox = tk.Listbox(
+            facet_list_frame,
+            selectmode=tk.MULTIPLE,
+            exportselection=False,
+            bg=self.colors["list_background"],
+            fg=self.colors["foreground"],
+            selectbackground=self.colors["highlight"],
+            highlightthickness=0,
+            relief=tk.FLAT,
+            yscrollcommand=facet_scrollbar.set
+        )
+        self.facet_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        facet_scrollbar.config(command=self.facet_listbox.yview)
+        self.facet_listbox.bind("<<ListboxSelect>>", self.on_facet_select)
+
         self.right_frame = tk.Frame(self.paned, bg=self.colors["background"])
         self.paned.add(self.right_frame)
 
@@ -514,9 +3008,25 @@ class ImageBrowserApp:
         self.current_image_path = None
         self.fullscreen_window = None
         self.all_files = []
+        self.records = []
+        self.records_by_name = {}
+        self.facets = TagFacets()
+        self.facet_filter = set()
+        self.records_folder = None
+        self.facet_keys = []
+        self.facet_refresh_id = None
+        self.last_query = None
+        self.last_matches = []
+        self.groups = {}  # group key -> its records in last_matches, in group mode
 
-        self.load_images()
         self.canvas.bind("<Configure>", self.on_canvas_resize)
+        self.canvas.bind("<Double-Button-1>", self.toggle_zoom_view)
+        self.canvas.bind("<MouseWheel>", self.on_canvas_wheel)
+        self.canvas.bind("<Button-4>", self.on_canvas_wheel)
+        self.canvas.bind("<Button-5>", self.on_canvas_wheel)
+        self.canvas.bind("<ButtonPress-1>", self.on_canvas_press)
+        self.canvas.bind("<B1-Motion>", self.on_canvas_drag)
+        self.canvas.bind("<Escape>", self.close_zoom_view)
 
         style = ttk.Style()
         style.theme_use("clam")  # looks good in dark mode
@@ -540,6 +3050,9 @@ class ImageBrowserApp:
             "add_tag": self.add_custom_tag,
             "make_index": self.make_index_file,
             "remove_tag": self.remove_custom_tag,
+            "refactor_tag": self.refactor_tag,
+            "contact_sheet": self.export_contact_sheets,
+            "select_broken": self.select_broken_files,
             "open_help": self.open_help_url
         }
 
@@ -561,13 +3074,586 @@ class ImageBrowserApp:
             binding = self.normalize_binding(raw_key)
             self.root.bind_all(binding, partial(self._tag_shortcut_handler, i))
 
-        # Set the focus on file list and select first item on app load
-        if self.listbox.size() > 0:
-            self.listbox.selection_set(0)
-            self.listbox.activate(0)
-            self.listbox.event_generate("<<ListboxSelect>>")
         self.listbox.focus_set()
 
+        # The folder scan and first decode run off the UI thread so the
+        # window is mapped before any disk or PIL work happens.
+        self.root.bind("<Map>", lambda e: self.mark_startup("first_window"), add="+")
+        if self.benchmark:
+            self.root.after(30000, self.root.destroy)
+        # Set before the first poll: it may already run on_image_decoded
+        self.ingest_service = None
+        self.ingest_refresh_id = None
+        self.decode_service = None
+        self.decode_failed_path = None
+        self.browse_server = None
+        self.start_initial_scan()
+        self.poll_ui_queue()
+
+        decode_workers = self.config.getint("Settings", "decode_workers", fallback=0)
+        if decode_workers > 0:
+            self.start_decode_service(decode_workers)
+        if self.config.getboolean("Ingest", "enabled", fallback=False):
+            self.start_ingest_service()
+        if self.config.getboolean("Server", "enabled", fallback=False):
+            self.start_browse_server()
+
+    def start_decode_service(self, workers):
+        import atexit
+        slot_bytes = self.root.winfo_screenwidth() * self.root.winfo_screenheight() * 4
+        try:
+            self.decode_service = DecodeService(
+                lambda fn, args: self.ui_queue.put((fn, args)),
+                workers, slot_bytes, workers + 2, self.decoder_for
+            )
+        except Exception:
+            self.decode_service = None
+            return
+        atexit.register(self.decode_service.shutdown)
+
+    def prefetch_neighbours(self, path, box):
+        name = os.path.basename(path)
+        if name not in self.records_by_name:
+            return
+        names = self.listed_filenames()
+        try:
+            index = names.index(name)
+        except ValueError:
+            return
+        for neighbour in (index + 1, index - 1):
+            if 0 <= neighbour < len(names) and not names[neighbour].lower().endswith(self.video_extensions):
+                if not self.decode_service.free:
+                    break
+                self.decode_service.request(os.path.join(self.current_folder, names[neighbour]), box)
+
+    def start_ingest_service(self):
+        folder = self.config.get("Ingest", "folder", fallback=self.default_folder)
+        model_base_dir = self.config.get("Settings", "ModelBaseDir", fallback=None)
+        if not os.path.isdir(folder) or not model_base_dir or not os.path.isdir(model_base_dir):
+            return
+        dirs = (
+            model_base_dir,
+            self.config.get("Settings", "VideoBaseDir", fallback=None),
+            self.config.get("Settings", "VideoAllDir", fallback=None),
+        )
+        self.ingest_service = IngestService(
+            folder, dirs, self.supported_formats, self.video_extensions,
+            os.path.join(self.cache_dir, "ingest.log"),
+            poll_seconds=self.config.getfloat("Ingest", "poll_seconds", fallback=5.0),
+            settle_seconds=self.config.getfloat("Ingest", "settle_seconds", fallback=10.0),
+            workers=self.config.getint("Ingest", "workers", fallback=2),
+            on_change=lambda: self.ui_queue.put((self.on_ingest_change, ())),
+        )
+        self.ingest_service.start()
+
+    def start_browse_server(self):
+        self.browse_server = BrowseServer(
+            server_roots(self.config), self.supported_formats, self.video_extensions, self.cache_dir,
+            host=self.config.get("Server", "host", fallback="127.0.0.1"),
+            port=self.config.getint("Server", "port", fallback=8765),
+            workers=self.config.getint("Server", "workers", fallback=2),
+            cache_mb=self.config.getint("Server", "cache_mb", fallback=1024),
+            on_rename=lambda folder, old, new: self.ui_queue.put((self.on_server_rename, (folder, old, new))),
+        )
+        self.browse_server.start()
+
+    def on_server_rename(self, folder, old_name, new_name):
+        # A tag edit from the browser: patch the list in place if it's the
+        # folder on screen, keeping the selection where it was
+        if os.path.normcase(os.path.abspath(folder)) != os.path.normcase(os.path.abspath(self.current_folder)):
+            return
+        selected = [new_name if name == old_name else name for name in self.selected_filenames()]
+        self.update_records(renamed=[(old_name, new_name)])
+        self.select_filenames(selected)
+
+    def on_ingest_change(self):
+        # Coalesce bursts of ingest moves into one refresh of the list
+        if os.path.normcase(os.path.abspath(self.current_folder)) != \
+                os.path.normcase(os.path.abspath(self.ingest_service.folder)):
+            return
+        if self.ingest_refresh_id:
+            self.root.after_cancel(self.ingest_refresh_id)
+        self.ingest_refresh_id = self.root.after(500, self.reload_keep_selection)
+
+    def reload_keep_selection(self):
+        self.ingest_refresh_id = None
+        selected = self.selected_filenames()
+        self.load_images()
+        self.select_filenames(selected)
+
+    def select_filenames(self, names, fire_event=True):
+        positions = {name: idx for idx, name in enumerate(self.row_names) if name is not None}
+        indexes = [positions[n] for n in names if n in positions]
+        if not indexes:
+            return
+        self.listbox.selection_clear(0, tk.END)
+        for idx in indexes:
+            self.listbox.selection_set(idx)
+        self.listbox.activate(indexes[0])
+        self.listbox.see(indexes[0])
+        if fire_event:
+            self.listbox.event_generate("<<ListboxSelect>>")
+
+    def start_initial_scan(self):
+        self.canvas.create_text(
+            10, 10, anchor=tk.NW,
+            text="Loading...",
+            fill="white", font=("Arial", 14)
+        )
+        folder = self.current_folder
+        sort_method = self.sort_var.get()
+        ascending = self.sort_ascending
+        supported_formats = self.supported_formats
+        video_exts = self.video_extensions
+        # The preview is never larger than the screen, so a screen-sized
+        # decode (JPEG draft mode) is enough for the first image
+        box = (self.root.winfo_screenwidth(), self.root.winfo_screenheight())
+
+        def worker():
+            try:
+                entries = scan_folder(folder, supported_formats, video_exts)
+            except Exception:
+                self.ui_queue.put((self.on_initial_scan_done, (folder, None)))
+                return
+            entries.sort(key=SORT_KEYS.get(sort_method, SORT_KEYS["Name"]), reverse=not ascending)
+            self.ui_queue.put((self.on_initial_scan_done, (folder, entries)))
+            if entries:
+                path = os.path.join(folder, entries[0].name)
+                try:
+                    decoded = decode_image(path, box)
+                except Exception:
+                    decoded = None
+                self.ui_queue.put((self.on_image_decoded, (path, decoded)))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def poll_ui_queue(self):
+        # One failing callback is reported like any Tk callback error; it
+        # must not stop the results that are still to come
+        while True:
+            try:
+                callback, args = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception:
+                self.root.report_callback_exception(*sys.exc_info())
+        self.root.after(30, self.poll_ui_queue)
+
+    def on_initial_scan_done(self, folder, entries):
+        if folder != self.current_folder:
+            return  # user already moved on to another folder
+        if entries is None:
+            self.load_images()  # re-run synchronously to show the error
+            return
+        self.set_records(entries)
+        if entries:
+            self.pending_decode = os.path.join(folder, entries[0].name)
+        else:
+            self.mark_startup("first_image")
+        self.apply_sort()
+        self.start_metadata_probe()
+        self.start_integrity_scan()
+
+    def start_metadata_probe(self):
+        # Probe image headers for the whole folder in the background. Cached
+        # rows are reused when mtime and size match; results come back in
+        # batches through the UI queue and stale generations are dropped.
+        self.probe_generation += 1
+        generation = self.probe_generation
+        folder = self.current_folder
+        if folder != self.metadata_folder:
+            self.metadata = {}
+            self.metadata_folder = folder
+        items = [(r.name, r.mtime, r.size) for r in self.records]
+        video_exts = self.video_extensions
+        cache = self.metadata_cache
+
+        def worker():
+            try:
+                cached = cache.load_folder(folder)
+            except Exception:
+                cached = {}
+            known, misses = {}, []
+            for name, mtime, size in items:
+                row = cached.get(name)
+                if row and row[0] == mtime and row[1] == size:
+                    known[name] = decode_meta(row[2])
+                else:
+                    misses.append((name, mtime, size))
+            self.ui_queue.put((self.on_metadata, (generation, known, not misses)))
+
+            batch, rows = {}, []
+            for i, (name, mtime, size) in enumerate(misses):
+                if generation != self.probe_generation:
+                    return
+                probe = probe_video if name.lower().endswith(video_exts) else probe_image
+                try:
+                    meta = probe(os.path.join(folder, name))
+                except Exception:
+                    meta = None
+                batch[name] = meta
+                rows.append((name, mtime, size, encode_meta(meta)))
+                if len(rows) >= 200 or i == len(misses) - 1:
+                    try:
+                        cache.store(folder, rows)
+                    except Exception:
+                        pass
+                    self.ui_queue.put((self.on_metadata, (generation, batch, i == len(misses) - 1)))
+                    batch, rows = {}, []
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_metadata(self, generation, batch, done):
+        if generation != self.probe_generation:
+            return
+        self.metadata.update(batch)
+        if not done:
+            return
+        self.start_decoder_selection()
+        # Only reshuffle the list once, when the whole folder is known
+        if self.sort_var.get() in META_SORT_KEYS:
+            self.apply_sort()
+        elif parse_query(self.search_var.get())[1]:
+            self.update_file_list()
+
+    def start_integrity_scan(self):
+        # Fully decode every image (and check every video container) in a
+        # process pool, one worker per core unless [Integrity] workers says
+        # otherwise. Verdicts are cached by mtime and size, so after the
+        # first pass only new or changed files cost anything.
+        if not self.config.getboolean("Integrity", "enabled", fallback=True):
+            return
+        self.integrity_generation += 1
+        generation = self.integrity_generation
+        folder = self.current_folder
+        if folder != self.integrity_folder:
+            self.broken = {}
+            self.integrity_folder = folder
+        items = [(r.name, r.mtime, r.size, r.media == MEDIA_VIDEO) for r in self.records]
+        workers = self.config.getint("Integrity", "workers", fallback=0) or os.cpu_count() or 1
+        cache = self.integrity_cache
+
+        def worker():
+            try:
+                cached = cache.load_folder(folder)
+            except Exception:
+                cached = {}
+            known, misses = {}, []
+            for name, mtime, size, is_video in items:
+                row = cached.get(name)
+                if row and row[0] == mtime and row[1] == size:
+                    known[name] = row[2]
+                else:
+                    misses.append((name, mtime, size, is_video))
+            self.ui_queue.put((self.on_integrity, (generation, known)))
+            if not misses:
+                return
+
+            from concurrent.futures import ProcessPoolExecutor, BrokenExecutor
+            with self.integrity_lock:
+                if self.integrity_pool is None:
+                    self.integrity_pool = ProcessPoolExecutor(max_workers=workers)
+                pool = self.integrity_pool
+            results = None
+            try:
+                results = pool.map(
+                    check_file,
+                    [os.path.join(folder, m[0]) for m in misses],
+                    [m[3] for m in misses],
+                    chunksize=8,
+                )
+                batch, rows = {}, []
+                for (name, mtime, size, _), problem in zip(misses, results):
+                    if generation != self.integrity_generation:
+                        return
+                    batch[name] = problem
+                    rows.append((name, mtime, size, problem))
+                    if len(rows) >= 200:
+                        self.store_integrity(cache, folder, generation, batch, rows)
+                        batch, rows = {}, []
+                if rows:
+                    self.store_integrity(cache, folder, generation, batch, rows)
+            except BrokenExecutor:
+                # A worker died (or the app is closing); the next scan makes a new pool
+                with self.integrity_lock:
+                    if self.integrity_pool is pool:
+                        self.integrity_pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+            except Exception:
+                pass
+            finally:
+                if results is not None:
+                    results.close()  # cancels this scan's chunks that haven't started
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def stop_background_pools(self):
+        # Pending integrity checks and feature decodes would otherwise keep
+        # the process alive at exit
+        self.integrity_generation += 1
+        self.similarity_generation += 1
+        for pool in (self.integrity_pool, self.similarity_pool):
+            if pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+        if self.browse_server:
+            self.browse_server.stop()
+
+    def store_integrity(self, cache, folder, generation, batch, rows):
+        try:
+            cache.store(folder, rows)
+        except Exception:
+            pass
+        self.ui_queue.put((self.on_integrity, (generation, batch)))
+
+    def on_integrity(self, generation, batch):
+        if generation != self.integrity_generation:
+            return
+        changed = set()
+        for name, problem in batch.items():
+            if problem:
+                self.broken[name] = problem
+                changed.add(name)
+            elif self.broken.pop(name, None):
+                changed.add(name)
+        if not changed:
+            return
+        # Recolour only the rows whose verdict changed
+        for index, name in enumerate(self.row_names):
+            if name in changed:
+                fg = self.colors["invalid_foreground"] if name in self.broken else self.colors["foreground"]
+                self.listbox.itemconfig(index, {'fg': fg})
+
+    def ensure_similarity_order(self):
+        # Start a feature pass when the folder changed or files appeared that
+        # the current chain doesn't cover. Until it finishes, uncovered files
+        # sort by name after the rest.
+        if self.similarity_folder == self.current_folder and (
+                self.similarity_running or all(r.name in self.similarity_rank for r in self.records)):
+            return
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            if self.similarity_folder != self.current_folder:
+                messagebox.showwarning("Similarity", "The Similarity sort needs NumPy:\npip install numpy")
+            self.similarity_folder = self.current_folder
+            self.similarity_rank = {}
+            return
+        self.start_similarity_pass()
+
+    def start_similarity_pass(self):
+        # Thumbnails for files without cached features are decoded in a
+        # process pool; features are computed in NumPy batches and cached by
+        # mtime and size, so later passes only pay for the chain itself.
+        self.similarity_generation += 1
+        generation = self.similarity_generation
+        folder = self.current_folder
+        if folder != self.similarity_folder:
+            self.similarity_rank = {}
+            self.similarity_folder = folder
+        self.similarity_running = True
+        items = sorted(
+            ((r.name, r.mtime, r.size) for r in self.records if r.media != MEDIA_VIDEO),
+            key=lambda item: natural_key(item[0])
+        )
+        others = [r.name for r in self.records if r.media == MEDIA_VIDEO]
+        workers = os.cpu_count() or 1
+        cache = self.features_cache
+
+        def worker():
+            import numpy as np
+            ranks = {}
+            try:
+                try:
+                    cached = cache.load_folder(folder)
+                except Exception:
+                    cached = {}
+                features, misses = {}, []
+                for name, mtime, size in items:
+                    row = cached.get(name)
+                    if row and row[0] == mtime and row[1] == size:
+                        if row[2]:
+                            features[name] = decode_features(row[2])
+                    else:
+                        misses.append((name, mtime, size))
+                if misses:
+                    from concurrent.futures import ProcessPoolExecutor, BrokenExecutor
+                    with self.similarity_lock:
+                        if self.similarity_pool is None:
+                            self.similarity_pool = ProcessPoolExecutor(max_workers=workers)
+                        pool = self.similarity_pool
+                    thumbs = None
+                    try:
+                        thumbs = pool.map(
+                            similarity_thumbnail,
+                            [os.path.join(folder, m[0]) for m in misses],
+                            chunksize=16,
+                        )
+                        batch = []
+                        for i, (item, thumb) in enumerate(zip(misses, thumbs)):
+                            if generation != self.similarity_generation:
+                                return
+                            batch.append((item, thumb))
+                            if len(batch) >= 256 or i == len(misses) - 1:
+                                self.store_features(cache, folder, features, batch)
+                                batch = []
+                    except BrokenExecutor:
+                        # A worker died (or the app is closing); the next pass makes a new pool
+                        with self.similarity_lock:
+                            if self.similarity_pool is pool:
+                                self.similarity_pool = None
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        raise
+                    finally:
+                        if thumbs is not None:
+                            thumbs.close()  # cancels this pass's chunks that haven't started
+
+                names = [name for name, _, _ in items if name in features]
+                if names:
+                    chain = similarity_chain(np.vstack([features[name] for name in names]))
+                    ranks = {names[row]: rank for rank, row in enumerate(chain)}
+            except Exception:
+                pass
+            # Videos and unreadable files follow the chain in name order. A
+            # failed pass thus still covers every file and isn't retried.
+            for name in [name for name, _, _ in items] + sorted(others, key=natural_key):
+                ranks.setdefault(name, len(ranks))
+            self.ui_queue.put((self.on_similarity, (generation, ranks)))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    @staticmethod
+    def store_features(cache, folder, features, batch):
+        good = [(item, thumb) for item, thumb in batch if thumb is not None]
+        rows = [(name, mtime, size, None) for (name, mtime, size), thumb in batch if thumb is None]
+        if good:
+            matrix = image_features([thumb for _, thumb in good])
+            for ((name, mtime, size), _), row in zip(good, matrix):
+                features[name] = row
+                rows.append((name, mtime, size, encode_features(row)))
+        try:
+            cache.store(folder, rows)
+        except Exception:
+            pass
+
+    def on_similarity(self, generation, ranks):
+        if generation != self.similarity_generation:
+            return
+        self.similarity_running = False
+        self.similarity_rank = ranks
+        if self.sort_var.get() == "Similarity":
+            self.apply_sort()
+
+    def select_broken_files(self):
+        # Select every broken file in the current list (expanding their
+        # groups in group mode), ready for Delete.
+        broken = [r for r in self.last_matches if r.name in self.broken]
+        if not broken:
+            messagebox.showinfo("Integrity", "No broken files in the list.")
+            return
+        if self.group_var.get():
+            self.expanded_groups.update(r.group for r in broken)
+            self.populate_listbox()
+        self.select_filenames([r.name for r in broken])
+
+    def decoder_for(self, path):
+        # Backend for one file: the benchmark's pick for its extension, but
+        # Pillow for anything that might be animated (frame count unknown)
+        ext = os.path.splitext(path)[1].lower()
+        ext = ".jpg" if ext in JPEG_EXTS else ext
+        if ext != ".jpg":
+            meta = self.metadata.get(os.path.basename(path))
+            if meta is None or meta.frames != 1:
+                return "pillow"
+        return self.decoder_choice.get(ext, "pillow")
+
+    def start_decoder_selection(self):
+        # Pick the fastest installed backend per extension with a short
+        # benchmark on a sample from the current folder. Picks are kept in
+        # decoders.json and only redone when the installed set or screen
+        # size changes; new extensions are benchmarked as they turn up.
+        if self.decoder_benchmark_running:
+            return
+        installed = installed_decoders()
+        if self.decoder_setting != "auto":
+            forced = self.decoder_setting if self.decoder_setting in installed else "pillow"
+            extensions = DECODER_BACKENDS[forced].extensions
+            self.decoder_choice = {ext: forced for ext in (".jpg", ".png", ".webp")
+                                   if extensions is None or ext in extensions}
+            return
+        if installed == ["pillow"]:
+            return
+        box = (self.root.winfo_screenwidth(), self.root.winfo_screenheight())
+        state_path = os.path.join(self.cache_dir, "decoders.json")
+        if not self.decoder_choice:
+            try:
+                with open(state_path, encoding="utf-8") as f:
+                    state = json.load(f)
+                if state["installed"] == installed and state["box"] == list(box):
+                    self.decoder_choice = state["choice"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+        stills = {}
+        for record in self.records:
+            ext = ".jpg" if record.ext in JPEG_EXTS else record.ext
+            meta = self.metadata.get(record.name)
+            if ext not in self.decoder_choice and isinstance(meta, ImageMeta) and meta.frames == 1:
+                stills.setdefault(ext, []).append(record)
+        samples = {}
+        for ext, records in stills.items():
+            if any(b.extensions and ext in b.extensions for b in DECODER_BACKENDS.values()):
+                records.sort(key=lambda r: r.size)  # a median-sized file, not a thumbnail
+                samples[ext] = os.path.join(self.current_folder, records[len(records) // 2].name)
+        if not samples:
+            return
+        self.decoder_benchmark_running = True
+        choice = dict(self.decoder_choice)
+
+        def worker():
+            picked, timings = benchmark_decoders(samples, box, installed)
+            for ext in samples:
+                choice[ext] = picked.get(ext, "pillow")
+            try:
+                with open(state_path, "w", encoding="utf-8") as f:
+                    json.dump({"installed": installed, "box": list(box), "choice": choice, "timings": timings}, f, indent=1)
+            except OSError:
+                pass
+            self.ui_queue.put((self.on_decoders_chosen, (choice,)))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def on_decoders_chosen(self, choice):
+        self.decoder_benchmark_running = False
+        self.decoder_choice = choice
+
+    def on_image_decoded(self, path, decoded):
+        self.pending_decode = None
+        if decoded is not None and self.decoded_image[0] is None:
+            self.decoded_image = (path, decoded)
+        if path == self.current_image_path:
+            self.render_image()
+
+    def mark_startup(self, name):
+        if name in self.startup_marks:
+            return
+        self.startup_marks[name] = time.perf_counter() - _process_start
+        if self.benchmark and len(self.startup_marks) == 2:
+            for key, value in self.startup_marks.items():
+                print(f"{key}: {value * 1000:.1f} ms")
+            self.root.after(0, self.root.destroy)
+
+    def load_source_image(self, path, box):
+        # Keep the last decode while it is at least as large as the fitted
+        # size, so shrinking the window and re-selecting don't decode again
+        cached_path, decoded = self.decoded_image
+        if cached_path == path and decoded.image.width >= fit_size(*decoded.source_size, *box)[0]:
+            return decoded
+        decoded = decode_image(path, box, self.decoder_for(path))
+        self.decoded_image = (path, decoded)
+        return decoded
+
     def normalize_binding(self, key_str):
         key_str = key_str.strip()
 
@@ -595,9 +3681,9 @@ class ImageBrowserApp:
             return
 
         updated_filenames = []
+        renamed = []
 
-        for i in selection:
-            original_filename = self.listbox.get(i)
+        for original_filename in self.selected_filenames():
             base, ext = os.path.splitext(original_filename)
             modified_filename = f"{base} #{tag_value}{ext}"
             cleaned_filename = scrub_filename(modified_filename)
@@ -615,25 +3701,14 @@ class ImageBrowserApp:
             try:
                 os.rename(old_path, new_path)
                 updated_filenames.append(cleaned_filename)
+                renamed.append((original_filename, cleaned_filename))
             except Exception as e:
                 messagebox.showerror("Rename Failed", f"Failed to apply tag #{tag_value} to {original_filename}:\n{e}")
 
         if updated_filenames:
-            self.load_images()
-            filenames = self.listbox.get(0, tk.END)
-
-            self.listbox.selection_clear(0, tk.END)
-            for fname in updated_filenames:
-                try:
-                    idx = filenames.index(fname)
-                    self.listbox.selection_set(idx)
-                    self.listbox.activate(idx)
-                    self.listbox.see(idx)
-                except ValueError:
-                    continue
-
+            self.update_records(renamed=renamed)
+            self.select_filenames(updated_filenames)
             self.listbox.focus_set()
-            self.listbox.event_generate("<<ListboxSelect>>")
 
     def toss_to_model_folder(self, event=None):
         selection = self.listbox.curselection()
@@ -648,49 +3723,25 @@ class ImageBrowserApp:
             messagebox.showwarning("Invalid Base Folder", "ModelBaseDir is not defined or does not exist.")
             return
 
-        raw_video_exts = self.config.get("Settings", "videoextensions", fallback="")
-        video_exts = tuple(
-            ext.strip().lower() if ext.strip().startswith(".") else f".{ext.strip().lower()}"
-            for ext in raw_video_exts.split(",") if ext.strip()
-        )
-
-        filenames = [self.listbox.get(i) for i in selection]
+        filenames = self.selected_filenames()
         dialog, label, progress = self.show_status_dialog("Tossing to Model Folder", filenames)
-        moved_files = 0
+        moved_files = []
 
         for i, filename in enumerate(filenames):
             label.config(text=filename)
             dialog.update_idletasks()
 
-            match = re.match(r"([^-\s]+)", filename)
-            if not match:
+            record = self.records_by_name.get(filename)
+            target_dir = toss_target(record, model_base_dir, video_base_dir, video_all_dir) if record else None
+            if not target_dir:
                 continue
 
-            model_name = match.group(1)
-            file_ext = os.path.splitext(filename)[1].lower()
-            is_video = file_ext in video_exts
-
-            model_folder = os.path.join(model_base_dir, model_name)
-            model_folder_exists = os.path.isdir(model_folder)
-
-            if is_video:
-                if model_folder_exists and video_base_dir and os.path.isdir(video_base_dir):
-                    target_dir = video_base_dir
-                elif video_all_dir and os.path.isdir(video_all_dir):
-                    target_dir = video_all_dir
-                else:
-                    continue  # skip if neither video base dir exists
-            else:
-                if not model_folder_exists:
-                    continue
-                target_dir = model_folder
-
             src = os.path.join(self.current_folder, filename)
             dest = os.path.join(target_dir, filename)
 
             try:
                 shutil.move(src, dest)
-                moved_files += 1
+                moved_files.append(filename)
             except Exception as e:
                 messagebox.showerror("Move Failed", f"Could not move {filename}:\n{e}")
 
@@ -699,7 +3750,7 @@ class ImageBrowserApp:
         dialog.destroy()
 
         if moved_files:
-            self.load_images()
+            self.update_records(removed=moved_files)
 
 
     def load_config(self):
@@ -708,11 +3759,8 @@ class ImageBrowserApp:
         return config
 
     def get_supported_extensions(self):
-        extensions = self.config.get("Settings", "extensions", fallback=".jpg,.jpeg,.gif,.webp,.png")
-        video_extensions = self.config.get("Sections", "videoextensions", fallback=".mp4,.avi,.webm").lower()
-
-        self.video_extensions = tuple(e.strip().lower() for e in video_extensions.split(",") if e.strip())
-        return tuple(e.strip().lower() for e in extensions.split(",") if e.strip())
+        supported_formats, self.video_extensions = get_extensions(self.config)
+        return supported_formats
 
 
     def get_shortcuts(self):
@@ -752,28 +3800,7 @@ class ImageBrowserApp:
 
     def load_images(self):
         try:
-            def sort_key_factory(self, method):
-                def sort_key(filename):
-                    path = os.path.join(self.current_folder, filename)
-                    try:
-                        if method == "Size":
-                            return os.path.getsize(path)
-                        elif method == "Created":
-                            return os.path.getctime(path)
-                        elif method == "Modified":
-                            return os.path.getmtime(path)
-                        else:
-                            return filename.lower()
-                    except:
-                        return 0
-                return sort_key
-
-            sort_method = self.sort_var.get() if hasattr(self, 'sort_var') else "Name"
-            file_list = [f for f in os.listdir(self.current_folder) if f.lower().endswith(self.supported_formats)]
-            sort_key = self.sort_key_factory(sort_method)
-            self.all_files = sorted(file_list, key=sort_key, reverse=not getattr(self, 'sort_ascending', True))
-
-
+            self.set_records(scan_folder(self.current_folder, self.supported_formats, self.video_extensions))
         except Exception as e:
             self.canvas.delete("all")
             self.canvas.create_text(
@@ -782,35 +3809,46 @@ class ImageBrowserApp:
                 fill="white", font=("Arial", 14)
             )
             return
-        self.update_file_list()
+        self.apply_sort()
+        self.start_metadata_probe()
+        self.start_integrity_scan()
 
     def update_file_list(self, *args):
+        self.tile_view = None
+        self.stop_animation()
         self.listbox.delete(0, tk.END)
         self.current_image_path = None
         self.canvas.delete("all")
 
-        query = self.search_var.get().strip().lower().split()
-
-        def match_all_terms(filename):
-            name = filename.lower()
-            return all(term in name for term in query)
-
-        matching_files = [f for f in self.all_files if match_all_terms(f)]
-
-        for index, file in enumerate(matching_files):
-            self.listbox.insert(tk.END, file)
-            bg = self.colors["list_background"] if index % 2 == 0 else self.colors["list_background_alt"]
-
-            file_path = os.path.join(self.current_folder, file)
-            is_image = True
-            file_ext = os.path.splitext(file)[1].lower()
-            is_image = file_ext in self.supported_formats
-
-            fg = self.colors["foreground"] if is_image else self.colors["invalid_foreground"]
-            self.listbox.itemconfig(index, {'bg': bg, 'fg': fg})
-
-
-        if matching_files:
+        text = self.search_var.get().strip().lower()
+        query, filters = parse_query(text)
+        metadata = self.metadata
+        facet_tags = {TAG_IDS.get(key, -1) for key in self.facet_filter if key not in PRIORITY_TAGS}
+        facet_priorities = {int(key[1]) for key in self.facet_filter if key in PRIORITY_TAGS}
+
+        def match_all_terms(record):
+            if not all(term in record.lower for term in query):
+                return False
+            if facet_priorities and record.priority not in facet_priorities:
+                return False
+            if facet_tags and not facet_tags.issubset(record.tags):
+                return False
+            return all(f(metadata.get(record.name)) for f in filters)
+
+        # Typing more of a plain search can only narrow the previous matches
+        facet_key = frozenset(self.facet_filter)
+        if (self.last_query is not None and not filters and self.last_query[1] == facet_key
+                and text.startswith(self.last_query[0])):
+            candidates = self.last_matches
+        else:
+            candidates = self.records
+        matching = [r for r in candidates if match_all_terms(r)]
+        self.last_query = None if filters else (text, facet_key)
+        self.last_matches = matching
+        self.schedule_facet_refresh()
+        self.populate_listbox()
+
+        if self.row_names:
             self.listbox.selection_set(0)
             self.listbox.activate(0)
             self.listbox.event_generate("<<ListboxSelect>>")
@@ -821,6 +3859,125 @@ class ImageBrowserApp:
                 fill="white", font=("Arial", 14)
             )
 
+    def populate_listbox(self):
+        # Fill the listbox from last_matches. In group mode only one header
+        # row per model is created; a group's file rows are only built once
+        # it is expanded. Members are bucketed once here so expanding or
+        # selecting groups never rescans the whole list.
+        self.listbox.delete(0, tk.END)
+        texts, self.row_names, self.row_groups = [], [], []
+        self.groups = {}
+        if not self.group_var.get():
+            self.row_names = [r.name for r in self.last_matches]
+            self.row_groups = [None] * len(self.row_names)
+            texts = self.row_names
+        else:
+            groups = self.groups
+            for record in self.last_matches:
+                members = groups.get(record.group)
+                if members is None:
+                    groups[record.group] = [record]
+                else:
+                    members.append(record)
+            for key, members in groups.items():
+                expanded = key in self.expanded_groups
+                marker = "▾" if expanded else "▸"
+                model = members[0].model or "(no model)"
+                size = sum(r.size for r in members)
+                texts.append(f"{marker} {model}  ({len(members)} files, {format_size(size)})")
+                self.row_names.append(None)
+                self.row_groups.append(key)
+                if expanded:
+                    for record in members:
+                        texts.append(f"    {record.name}")
+                        self.row_names.append(record.name)
+                        self.row_groups.append(None)
+
+        if texts:
+            self.listbox.insert(tk.END, *texts)
+        for index, name in enumerate(self.row_names):
+            bg = self.colors["list_background"] if index % 2 == 0 else self.colors["list_background_alt"]
+            fg = self.colors["invalid_foreground"] if name in self.broken else self.colors["foreground"]
+            self.listbox.itemconfig(index, {'bg': bg, 'fg': fg})
+
+    def group_members(self, key):
+        return self.groups.get(key, [])
+
+    def selected_filenames(self):
+        # Filenames behind the selected rows; a selected group header stands
+        # for every matching file in that group.
+        names = []
+        for i in self.listbox.curselection():
+            if self.row_names[i] is not None:
+                names.append(self.row_names[i])
+            else:
+                names.extend(r.name for r in self.group_members(self.row_groups[i]))
+        return list(dict.fromkeys(names))
+
+    def listed_filenames(self):
+        return [name for name in self.row_names if name is not None]
+
+    def on_group_toggle(self):
+        self.expanded_groups.clear()
+        self.update_file_list()
+
+    def toggle_group_row(self, index, expand=None):
+        key = self.row_groups[index] if 0 <= index < len(self.row_groups) else None
+        if key is None:
+            return False
+        if expand is None:
+            expand = key not in self.expanded_groups
+        if expand == (key in self.expanded_groups):
+            return True
+        if expand:
+            self.expanded_groups.add(key)
+        else:
+            self.expanded_groups.discard(key)
+        top = self.listbox.yview()[0]
+        self.populate_listbox()
+        self.listbox.yview_moveto(top)
+        self.listbox.selection_set(index)
+        self.listbox.activate(index)
+        self.listbox.see(index)
+        return True
+
+    def on_listbox_double_click(self, event):
+        if self.toggle_group_row(self.listbox.nearest(event.y)):
+            return "break"
+
+    def on_listbox_expand(self, event, expand):
+        if self.toggle_group_row(self.listbox.index(tk.ACTIVE), expand):
+            return "break"
+
+    def on_facet_select(self, event=None):
+        self.facet_filter = {self.facet_keys[i] for i in self.facet_listbox.curselection()}
+        self.update_file_list()
+
+    def schedule_facet_refresh(self):
+        if self.facet_refresh_id:
+            self.root.after_cancel(self.facet_refresh_id)
+        self.facet_refresh_id = self.root.after(100, self.refresh_facets)
+
+    def refresh_facets(self):
+        self.facet_refresh_id = None
+        if self.search_var.get().strip() or self.facet_filter:
+            # Counts for the active filter come from the current matches only
+            matching = self.last_matches
+            tag_counts = Counter(t for r in matching for t in r.tags)
+            priority_counts = Counter(r.priority for r in matching if r.priority)
+        else:
+            tag_counts, priority_counts = self.facets.tag_counts, self.facets.priority_counts
+        rows = facet_rows(tag_counts, priority_counts, self.facet_filter)
+        top = self.facet_listbox.yview()[0]
+        self.facet_keys = [key for key, _ in rows]
+        self.facet_listbox.delete(0, tk.END)
+        if rows:
+            self.facet_listbox.insert(tk.END, *(label for _, label in rows))
+        for index, key in enumerate(self.facet_keys):
+            if key in self.facet_filter:
+                self.facet_listbox.selection_set(index)
+        self.facet_listbox.yview_moveto(top)
+
     def refresh_folder(self, event=None):
         self.load_images()
 
@@ -829,43 +3986,143 @@ class ImageBrowserApp:
         if not selection:
             return
 
-        filename = self.listbox.get(selection[0])
+        filename = self.row_names[selection[0]]
+        self.tile_view = None
+        self.stop_animation()
+        if filename is None:
+            self.show_group_summary(self.row_groups[selection[0]])
+            return
         filepath = os.path.join(self.current_folder, filename)
 
-        try:
-            Image.open(filepath).verify()
-            self.current_image_path = filepath
-            self.render_image()
-        except Exception:
+        # No validation pass here: render_image reports decode errors itself,
+        # and the background probe already knows which files aren't images.
+        if filename.lower().endswith(self.video_extensions):
+            self.show_video_info(filename)
+            return
+        if filename in self.metadata and self.metadata[filename] is None:
             self.current_image_path = None
             self.canvas.delete("all")  # 👈 Clear stale image
+            return
+        self.current_image_path = filepath
+        self.render_image()
+
+    def show_video_info(self, filename):
+        # Videos aren't played in the preview; show what the container says.
+        # A header probe is only a few KB, so do it here if the background
+        # probe hasn't reached this file yet.
+        self.current_image_path = None
+        self.canvas.delete("all")
+        meta = self.metadata.get(filename)
+        if meta is None and filename not in self.metadata:
+            try:
+                meta = probe_video(os.path.join(self.current_folder, filename))
+            except Exception:
+                meta = None
+        lines = [filename]
+        if meta:
+            lines.append(f"{meta.format}  {meta.codec or 'unknown codec'}")
+            lines.append(f"{meta.width} x {meta.height}")
+            lines.append(f"{format_duration(meta.duration)}  {meta.bitrate / 1_000_000:.1f} Mbit/s")
+        else:
+            lines.append("(container not recognised)")
+        record = self.records_by_name.get(filename)
+        if record:
+            lines.append(format_size(record.size))
+        self.canvas.create_text(10, 10, anchor=tk.NW, text="\n".join(lines), fill="white", font=("Arial", 14))
+
+    def show_group_summary(self, key):
+        members = self.group_members(key)
+        model = members[0].model if members and members[0].model else "(no model)"
+        size = sum(r.size for r in members)
+        self.current_image_path = None
+        self.canvas.delete("all")
+        self.canvas.create_text(
+            10, 10, anchor=tk.NW,
+            text=f"{model}\n{len(members)} files, {format_size(size)}",
+            fill="white", font=("Arial", 14)
+        )
+
+    def stop_animation(self):
+        if self.animation:
+            self.animation.stop()
+            self.animation = None
 
     def on_canvas_resize(self, event):
-        if self.current_image_path:
+        if self.tile_view:
+            self.tile_view.resize()
+        elif self.current_image_path:
             self.render_image()
 
-    def render_image(self):
+    def open_zoom_view(self):
+        if not self.current_image_path or self.current_image_path == self.pending_decode:
+            return None
+        self.stop_animation()
         try:
-            img = Image.open(self.current_image_path)
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
-            img_ratio = img.width / img.height
-            canvas_ratio = canvas_width / canvas_height
-
-            if img_ratio > canvas_ratio:
-                new_width = canvas_width
-                new_height = int(new_width / img_ratio)
-            else:
-                new_height = canvas_height
-                new_width = int(new_height * img_ratio)
+            self.tile_view = TileView(self.canvas, self.current_image_path)
+        except Exception:
+            self.tile_view = None
+        return self.tile_view
 
-            img = img.resize((new_width, new_height), Image.LANCZOS)
-            self.current_image = ImageTk.PhotoImage(img)
-            self.canvas.delete("all")
-            self.canvas.create_image(
-                canvas_width // 2, canvas_height // 2,
-                anchor=tk.CENTER, image=self.current_image
-            )
+    def close_zoom_view(self, event=None):
+        if self.tile_view:
+            self.tile_view = None
+            self.render_image()
+
+    def toggle_zoom_view(self, event=None):
+        if self.tile_view:
+            self.close_zoom_view()
+        elif self.open_zoom_view():
+            self.tile_view.zoom_at(event.x, event.y, 2.0)
+            self.canvas.focus_set()
+
+    def on_canvas_wheel(self, event):
+        zoom_in = event.num == 4 or event.delta > 0
+        # The fitted preview is as far out as it goes, so only zooming in
+        # switches to tiles
+        if not self.tile_view and (not zoom_in or not self.open_zoom_view()):
+            return
+        self.tile_view.zoom_at(event.x, event.y, 1.25 if zoom_in else 0.8)
+        self.canvas.focus_set()
+
+    def on_canvas_press(self, event):
+        self.drag_origin = (event.x, event.y)
+
+    def on_canvas_drag(self, event):
+        if not self.tile_view or not self.drag_origin:
+            return
+        dx = event.x - self.drag_origin[0]
+        dy = event.y - self.drag_origin[1]
+        self.drag_origin = (event.x, event.y)
+        self.tile_view.pan(dx, dy)
+
+    def render_image(self):
+        if self.current_image_path == self.pending_decode:
+            return  # background decode will render when it lands
+        path = self.current_image_path
+        if self.decode_service and self.decoded_image[0] != path:
+            box = (self.canvas.winfo_width(), self.canvas.winfo_height())
+
+            def on_frame(result):
+                if path != self.current_image_path or self.tile_view:
+                    return
+                if result is None:
+                    # Let the in-process path report the error
+                    self.decode_failed_path = path
+                    self.render_image()
+                    return
+                self.show_preview_photo(*result)
+
+            if self.decode_failed_path != path and self.decode_service.request(path, box, on_frame):
+                self.prefetch_neighbours(path, box)
+                return
+        try:
+            Image = pil_image()
+            from PIL import ImageTk
+            box = (self.canvas.winfo_width(), self.canvas.winfo_height())
+            decoded = self.load_source_image(self.current_image_path, box)
+            size = fit_size(*decoded.source_size, *box)
+            img = decoded.image if decoded.image.size == size else decoded.image.resize(size, Image.LANCZOS)
+            self.show_preview_photo(ImageTk.PhotoImage(img), decoded.animated)
         except Exception as e:
             self.canvas.delete("all")
             self.canvas.create_text(
@@ -874,6 +4131,27 @@ class ImageBrowserApp:
                 fill="white", font=("Arial", 14)
             )
 
+    def show_preview_photo(self, photo, animated):
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
+        self.current_image = photo
+        self.canvas.delete("all")
+        item = self.canvas.create_image(
+            canvas_width // 2, canvas_height // 2,
+            anchor=tk.CENTER, image=self.current_image
+        )
+        self.mark_startup("first_image")
+
+        self.stop_animation()
+        if animated:
+            def show_frame(photo):
+                self.current_image = photo
+                self.canvas.itemconfig(item, image=photo)
+            self.animation = AnimationPlayer(
+                self.root, self.current_image_path,
+                (canvas_width, canvas_height), show_frame
+            )
+
     def prompt_delete_selected_files(self, event=None):
         selection = self.listbox.curselection()
         if not selection:
@@ -883,10 +4161,11 @@ class ImageBrowserApp:
         if not confirm:
             return
 
-        filenames = [self.listbox.get(i) for i in selection]
+        filenames = self.selected_filenames()
         start_index = selection[0]
 
         dialog, label, progress = self.show_status_dialog("Deleting Files", filenames)
+        deleted = []
 
         for i, filename in enumerate(filenames):
             label.config(text=filename)
@@ -895,13 +4174,14 @@ class ImageBrowserApp:
             path = os.path.join(self.current_folder, filename)
             try:
                 os.remove(path)
+                deleted.append(filename)
             except Exception as e:
                 messagebox.showerror("Delete Failed", f"Could not delete {filename}:\n{e}")
 
             progress["value"] = i + 1
 
         dialog.destroy()
-        self.load_images()
+        self.update_records(removed=deleted)
 
         # Try to restore selection near previous location
         num_items = self.listbox.size()
@@ -922,8 +4202,9 @@ class ImageBrowserApp:
         if not target_dir:
             return
 
-        filenames = [self.listbox.get(i) for i in selection]
+        filenames = self.selected_filenames()
         dialog, label, progress = self.show_status_dialog("Moving Files", filenames)
+        moved = []
 
         for i, filename in enumerate(filenames):
             label.config(text=filename)
@@ -932,13 +4213,16 @@ class ImageBrowserApp:
             dest = os.path.join(target_dir, filename)
             try:
                 shutil.move(source, dest)
+                moved.append(filename)
             except Exception as e:
                 messagebox.showerror("Move Failed", f"Failed to move {filename}:\n{e}")
             progress["value"] = i + 1
 
         dialog.destroy()
 
-        self.load_images()
+        if os.path.normcase(os.path.abspath(target_dir)) == os.path.normcase(os.path.abspath(self.current_folder)):
+            moved = []
+        self.update_records(removed=moved)
 
     def copy_files_to_folder(self, event=None):
         selection = self.listbox.curselection()
@@ -948,7 +4232,7 @@ class ImageBrowserApp:
         if not target_dir:
             return
 
-        filenames = [self.listbox.get(i) for i in selection]
+        filenames = self.selected_filenames()
         dialog, label, progress = self.show_status_dialog("Copying Files", filenames)
 
         for i, filename in enumerate(filenames):
@@ -969,8 +4253,8 @@ class ImageBrowserApp:
         if not selection:
             return
 
-        for i in selection:
-            original_filename = self.listbox.get(i)
+        renamed = []
+        for original_filename in self.selected_filenames():
             new_filename = scrub_filename(original_filename)
 
             if new_filename != original_filename:
@@ -983,15 +4267,19 @@ class ImageBrowserApp:
 
                 try:
                     os.rename(old_path, new_path)
+                    renamed.append((original_filename, new_filename))
                 except Exception as e:
                     messagebox.showerror("Rename Failed", f"Failed to rename {original_filename}:\n{e}")
-        self.load_images()
+        self.update_records(renamed=renamed)
 
     def prompt_rename_selected_file(self, event=None):
         selection = self.listbox.curselection()
         if not selection:
             return
-        old_name = self.listbox.get(selection[0])
+        filenames = self.selected_filenames()
+        if not filenames:
+            return
+        old_name = filenames[0]
         old_path = os.path.join(self.current_folder, old_name)
         new_name = simpledialog.askstring("Rename File", f"Enter new name for:\n{old_name}", initialvalue=old_name)
         if not new_name or new_name.strip() == "":
@@ -1002,7 +4290,10 @@ class ImageBrowserApp:
             return
         try:
             os.rename(old_path, new_path)
-            self.load_images()
+            if os.path.dirname(new_name):
+                self.load_images()
+            else:
+                self.update_records(renamed=[(old_name, new_name)])
         except Exception as e:
             messagebox.showerror("Rename Failed", f"Unable to rename file:\n{e}")
 
@@ -1010,31 +4301,68 @@ class ImageBrowserApp:
         selection = self.listbox.curselection()
         if not selection:
             return
-        self.fullscreen_index = selection[0]
-        self.fullscreen_images = self.listbox.get(0, tk.END)
+        filename = self.row_names[selection[0]]
+        if filename is None:
+            self.toggle_group_row(selection[0])
+            return
+        self.fullscreen_images = self.listed_filenames()
+        self.fullscreen_index = self.fullscreen_images.index(filename)
         self.open_fullscreen_window()
 
+    def stop_fullscreen_animation(self):
+        if self.fullscreen_animation:
+            self.fullscreen_animation.stop()
+            self.fullscreen_animation = None
+
+    def fullscreen_previous_image(self, event=None):
+        if self.fullscreen_index > 0:
+            self.fullscreen_index -= 1
+            self.open_fullscreen_window()
+
+    def fullscreen_next_image(self, event=None):
+        if self.fullscreen_index < len(self.fullscreen_images) - 1:
+            self.fullscreen_index += 1
+            self.open_fullscreen_window()
+
     def open_fullscreen_window(self):
         try:
             image_name = self.fullscreen_images[self.fullscreen_index]
             full_path = os.path.join(self.current_folder, image_name)
+            screen_width = self.root.winfo_screenwidth()
+            screen_height = self.root.winfo_screenheight()
+            box = (screen_width, screen_height)
+
+            if self.decode_service:
+                def on_frame(result):
+                    if self.fullscreen_images[self.fullscreen_index] != image_name:
+                        return
+                    if result is None:
+                        os.startfile(full_path)
+                        return
+                    self.show_fullscreen_photo(full_path, *result)
+
+                if self.decode_service.request(full_path, box, on_frame):
+                    for neighbour in (self.fullscreen_index + 1, self.fullscreen_index - 1):
+                        if 0 <= neighbour < len(self.fullscreen_images) and self.decode_service.free:
+                            self.decode_service.request(
+                                os.path.join(self.current_folder, self.fullscreen_images[neighbour]), box)
+                    return
+
             try:
-                img = Image.open(full_path)
+                from PIL import ImageTk
+                decoded = decode_image(full_path, box, self.decoder_for(full_path))
             except Exception:
                 os.startfile(full_path)
                 return
+            self.show_fullscreen_photo(full_path, ImageTk.PhotoImage(decoded.image), decoded.animated)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not display fullscreen image:\n\n{e}")
+
+    def show_fullscreen_photo(self, full_path, fullscreen_img, is_animated):
+        try:
             screen_width = self.root.winfo_screenwidth()
             screen_height = self.root.winfo_screenheight()
-            img_ratio = img.width / img.height
-            screen_ratio = screen_width / screen_height
-            if img_ratio > screen_ratio:
-                new_width = screen_width
-                new_height = int(new_width / img_ratio)
-            else:
-                new_height = screen_height
-                new_width = int(new_height * img_ratio)
-            img = img.resize((new_width, new_height), Image.LANCZOS)
-            fullscreen_img = ImageTk.PhotoImage(img)
+            self.stop_fullscreen_animation()
             if self.fullscreen_window and self.fullscreen_window.winfo_exists():
                 self.fullscreen_window.destroy()
             self.fullscreen_window = tk.Toplevel(self.root)
@@ -1047,12 +4375,102 @@ class ImageBrowserApp:
             label = tk.Label(self.fullscreen_window, image=fullscreen_img, bg="black")
             label.image = fullscreen_img
             label.pack(expand=True)
+            self.fullscreen_window.bind("<Destroy>", lambda e: self.stop_fullscreen_animation())
+
+            if is_animated:
+                def show_frame(photo):
+                    label.config(image=photo)
+                    label.image = photo
+                self.fullscreen_animation = AnimationPlayer(
+                    self.root, full_path, (screen_width, screen_height), show_frame
+                )
         except Exception as e:
             messagebox.showerror("Error", f"Could not display fullscreen image:\n\n{e}")
 
 
+def export_contact_sheets_headless(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog="vtview --contact-sheet")
+    parser.add_argument("folder")
+    parser.add_argument("--out", help="output folder (default: <folder>/contact-sheets)")
+    parser.add_argument("--columns", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=8)
+    parser.add_argument("--cell", type=int, default=256)
+    parser.add_argument("--recursive", action="store_true", help="one set of sheets per subfolder too")
+    parser.add_argument("--no-labels", action="store_true")
+    args = parser.parse_args(argv)
+
+    config = configparser.ConfigParser()
+    config.read(os.path.join(os.path.dirname(os.path.abspath(__file__)), "vtview.ini"))
+    set_max_image_pixels(config)
+    supported_formats, video_exts = get_extensions(config)
+    image_exts = tuple(e for e in supported_formats if e not in video_exts)
+    out_dir = args.out or os.path.join(args.folder, "contact-sheets")
+
+    folders = [args.folder]
+    if args.recursive:
+        folders = []
+        for root, dirs, _ in os.walk(args.folder):
+            # Never make sheets of earlier sheets
+            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != os.path.abspath(out_dir)]
+            folders.append(root)
+    base_name = os.path.basename(os.path.abspath(args.folder)) or "contact"
+    for folder in folders:
+        records = sorted(scan_folder(folder, image_exts), key=SORT_KEYS["Natural"])
+        if not records:
+            continue
+        # Named by the path under FOLDER so same-named subfolders don't collide
+        relative = os.path.relpath(folder, args.folder)
+        prefix = base_name if relative == "." else "_".join([base_name, *relative.split(os.sep)])
+        written = build_contact_sheets(
+            [os.path.join(folder, r.name) for r in records], out_dir, prefix,
+            columns=args.columns, rows=args.rows, cell=args.cell, labels=not args.no_labels
+        )
+        print(f"{folder}: {len(records)} images, {len(written)} sheet(s)")
+
+def serve_headless(argv):
+    import argparse
+    parser = argparse.ArgumentParser(prog="vtview --serve")
+    parser.add_argument("--host", help="address to bind (default: [Server] host, else 127.0.0.1)")
+    parser.add_argument("--port", type=int, help="default: [Server] port, else 8765")
+    parser.add_argument("--workers", type=int, help="decode processes (default: [Server] workers, else 2)")
+    args = parser.parse_args(argv)
+
+    config = configparser.ConfigParser()
+    config.read(os.path.join(os.path.dirname(os.path.abspath(__file__)), "vtview.ini"))
+    set_max_image_pixels(config)
+    supported_formats, video_exts = get_extensions(config)
+
+    server = BrowseServer(
+        server_roots(config), supported_formats, video_exts, get_cache_dir(config),
+        host=args.host or config.get("Server", "host", fallback="127.0.0.1"),
+        port=args.port or config.getint("Server", "port", fallback=8765),
+        workers=args.workers or config.getint("Server", "workers", fallback=2),
+        cache_mb=config.getint("Server", "cache_mb", fallback=1024),
+    )
+    if not server.roots:
+        sys.exit("No existing folders to serve; set roots under [Server].")
+    print(f"Serving {', '.join(server.roots.values())} on http://{server.host}:{server.port}/")
+    try:
+        server.run()
+    except KeyboardInterrupt:
+        pass
+
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()  # decode workers in the PyInstaller build
+    if "--contact-sheet" in sys.argv:
+        argv = sys.argv[1:]
+        argv.remove("--contact-sheet")
+        export_contact_sheets_headless(argv)
+        sys.exit(0)
+    if "--serve" in sys.argv:
+        argv = sys.argv[1:]
+        argv.remove("--serve")
+        serve_headless(argv)
+        sys.exit(0)
     root = tk.Tk()
     root.state('zoomed')
-    app = ImageBrowserApp(root)
+    app = ImageBrowserApp(root, benchmark="--benchmark-startup" in sys.argv)
     root.mainloop()
+    app.stop_background_pools()